@@ -6,18 +6,26 @@ from scipy.spatial.transform import Rotation as R
 import json
 from datetime import datetime, timedelta
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+import emotion_backend
+from media_probe import open_at_frame
+
 # Get the absolute path to the model file
-model_path = os.path.join(os.path.dirname(__file__), 'models', 'emotion-ferplus-8.onnx')
+model_path = emotion_backend.model_path()
 
-# Initialize MediaPipe Face Mesh
+# MediaPipe Face Mesh; the graph runs its own threads, which do not survive fork(),
+# and keeps tracking state between frames, so it is never shared: analyze_video
+# creates one per call and get_face_mesh keeps one per thread and process
 mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, min_detection_confidence=0.5)
+_face_mesh_local = threading.local()
 
 # Emotion list
-EMOTIONS = ["neutral", "happiness", "surprise", "sadness", "anger", "disgust", "fear", "contempt"]
+EMOTIONS = emotion_backend.EMOTIONS
 
 def get_gaze_direction(landmarks, frame_shape):
     """
@@ -110,83 +118,264 @@ def is_speaking(landmarks):
     distance = np.linalg.norm(upper_lip_mean - lower_lip_mean)
     return distance
 
-def analyze_video(video_path):
+def _load_emotion_model():
+    # Backend and weights are chosen by EMOTION_BACKEND / EMOTION_MODEL_VARIANT
+    return emotion_backend.create_emotion_model()
+
+def _new_face_mesh():
+    return mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, min_detection_confidence=0.5)
+
+def get_face_mesh():
+    """Returns the calling thread's FaceMesh, recreating it after a fork."""
+    if getattr(_face_mesh_local, "pid", None) != os.getpid():
+        _face_mesh_local.mesh = _new_face_mesh()
+        _face_mesh_local.pid = os.getpid()
+    return _face_mesh_local.mesh
+
+def preload():
     """
-    Analyzes a video file to extract head pose, gaze, blink rate, speaking, and emotion.
+    Loads model data that can be shared copy-on-write with forked workers.
+    """
+    emotion_backend.read_model(emotion_backend.configured_variant())
+
+def warm_up():
+    """
+    Runs FaceMesh and the emotion model once on dummy input so the first
+    request does not pay for graph initialization.
+    """
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    analyze_frame(frame, get_face_mesh(), None)
+    _load_emotion_model().predict(np.zeros((1, 1, 64, 64), dtype=np.float32))
+
+def _add_time(timings, stage, start):
+    """Adds the time since `start` to `timings[stage]` and returns the current time."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - start)
+    return now
+
+def analyze_frame(frame, mesh, emotion_model, timings=None):
+    """
+    Runs the per-frame measurements on a single BGR frame.
     Args:
-        video_path: The path to the video file.
+        frame: The BGR video frame.
+        mesh: The MediaPipe FaceMesh instance to use.
+        emotion_model: The emotion classifier, or None to skip emotion inference.
+        timings: Optional dict accumulating seconds spent in facemesh/pose/emotion.
     Returns:
-        A dictionary containing the analysis results.
+        A dictionary with the frame measurements, or None if no face was found.
+    """
+    start = time.perf_counter()
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    face_results = mesh.process(rgb_frame)
+    start = _add_time(timings, "facemesh", start)
+
+    if not face_results.multi_face_landmarks:
+        return None
+
+    face_landmarks = face_results.multi_face_landmarks[0]
+    h, w, _ = frame.shape
+    record = {}
+
+    # Head Pose
+    face_3d = np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks.landmark])
+    rot = R.from_euler('xyz', face_3d.mean(axis=0), degrees=True)
+    pitch, yaw, roll = rot.as_euler('xyz', degrees=True)
+    record["head_pose"] = {"pitch": pitch, "yaw": yaw, "roll": roll}
+
+    # Gaze
+    record["gaze"] = get_gaze_direction(face_landmarks, frame.shape)
+
+    # Blinks
+    record["blink"] = bool(get_blink_rate(face_landmarks))
+
+    # Speaking
+    record["speaking"] = bool(is_speaking(face_landmarks))
+    start = _add_time(timings, "pose", start)
+
+    # Emotion
+    record["emotion"] = None
+    if emotion_model is None:
+        return record
+
+    x_min = int(face_3d[:, 0].min() * w)
+    y_min = int(face_3d[:, 1].min() * h)
+    x_max = int(face_3d[:, 0].max() * w)
+    y_max = int(face_3d[:, 1].max() * h)
+
+    face_roi = frame[max(y_min, 0):y_max, max(x_min, 0):x_max]
+    if face_roi.size == 0:
+        return record
+
+    gray_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
+    emotion_preds = emotion_model.predict(emotion_backend.preprocess_face(gray_face))
+    emotion_index = np.argmax(emotion_preds)
+    record["emotion"] = EMOTIONS[emotion_index] if emotion_index < len(EMOTIONS) else "neutral"
+    _add_time(timings, "emotion", start)
+    return record
+
+def _scale_frame(frame, max_height):
+    h, w = frame.shape[:2]
+    if not max_height or h <= max_height:
+        return frame
+    scale = max_height / float(h)
+    return cv2.resize(frame, (int(w * scale), max_height), interpolation=cv2.INTER_AREA)
+
+def _analyze_range(video_path, start, end, frame_stride, max_height, mesh, emotion_model, timings=None,
+                   checkpoint=None, seekable=True):
+    """
+    Analyzes frames [start, end) of a video, sampling every `frame_stride` frames.
+    With a checkpoints.FrameCheckpoint, previously saved records are reused and
+    analysis resumes after the last of them; new records are appended as they are made.
+    `seekable` is False for containers whose frame seeks are unreliable; the start
+    frame is then reached by grabbing from the beginning.
+    Returns a list of (frame_index, record) tuples in frame order and the number of frames read.
     """
-    cap = cv2.VideoCapture(video_path)
+    records, frame_index = [], start
+    if checkpoint is not None:
+        records, frame_index, frames_read = checkpoint.load()
+        if frames_read is not None:
+            return records, frames_read
+
+    cap = open_at_frame(video_path, frame_index, seekable)
     if not cap.isOpened():
-        return {"error": "Could not open video file."}
+        if checkpoint is not None:
+            checkpoint.close()
+        raise IOError(f"Could not open video file: {video_path}")
+
+    try:
+        while end is None or frame_index < end:
+            decode_start = time.perf_counter()
+            # grab() skips the colour conversion and copy for frames we do not sample
+            if frame_index % frame_stride:
+                ok = cap.grab()
+                _add_time(timings, "decode", decode_start)
+                if not ok:
+                    break
+                frame_index += 1
+                continue
+
+            ret, frame = cap.read()
+            if ret:
+                frame = _scale_frame(frame, max_height)
+            _add_time(timings, "decode", decode_start)
+            if not ret:
+                break
+            record = analyze_frame(frame, mesh, emotion_model, timings)
+            records.append((frame_index, record))
+            if checkpoint is not None:
+                checkpoint.append(frame_index, record)
+            frame_index += 1
+        if checkpoint is not None:
+            checkpoint.complete(frame_index - start)
+    finally:
+        cap.release()
+        if checkpoint is not None:
+            checkpoint.close()
+    return records, frame_index - start
 
+def summarize_frames(records, frames_read=0, frame_stride=1, timings=None):
+    """
+    Aggregates ordered per-frame records into the analysis result dictionary.
+    `timings` holds per-stage seconds summed over frames (and over workers when parallel).
+    """
     results = {
         "head_pose": [], "gaze": [], "blinks": 0, "speaking_frames": 0, "emotions": []
     }
-    
-    emotion_model = cv2.dnn.readNetFromONNX(model_path)
-    
-    blink_counter = 0
-    speaking_counter = 0
-    frame_count = 0
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        frame_count += 1
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_results = face_mesh.process(rgb_frame)
-
-        if face_results.multi_face_landmarks:
-            for face_landmarks in face_results.multi_face_landmarks:
-                # Head Pose
-                h, w, _ = frame.shape
-                face_3d = np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks.landmark])
-                rot = R.from_euler('xyz', face_3d.mean(axis=0), degrees=True)
-                pitch, yaw, roll = rot.as_euler('xyz', degrees=True)
-                results["head_pose"].append({"pitch": pitch, "yaw": yaw, "roll": roll})
-
-                # Gaze
-                gaze = get_gaze_direction(face_landmarks, frame.shape)
-                results["gaze"].append(gaze)
-
-                # Blinks
-                if get_blink_rate(face_landmarks):
-                    blink_counter += 1
-
-                # Speaking
-                if is_speaking(face_landmarks):
-                    speaking_counter += 1
-
-                # Emotion
-                x_min = int(min([lm.x for lm in face_landmarks.landmark]) * w)
-                y_min = int(min([lm.y for lm in face_landmarks.landmark]) * h)
-                x_max = int(max([lm.x for lm in face_landmarks.landmark]) * w)
-                y_max = int(max([lm.y for lm in face_landmarks.landmark]) * h)
-                
-                face_roi = frame[y_min:y_max, x_min:x_max]
-                if face_roi.size == 0:
-                    continue
-                
-                gray_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-                resized_face = cv2.resize(gray_face, (64, 64))
-                processed_face = resized_face.astype(np.float32) / 255.0
-                processed_face = np.expand_dims(np.expand_dims(processed_face, -1), 0)
-                
-                emotion_model.setInput(processed_face)
-                emotion_preds = emotion_model.forward()
-                emotion_index = np.argmax(emotion_preds)
-                emotion = EMOTIONS[emotion_index] if emotion_index < len(EMOTIONS) else "neutral"
-                results["emotions"].append(emotion)
-
-    cap.release()
-    
-    results["blinks"] = blink_counter
-    results["speaking_frames"] = speaking_counter
-    results["total_frames"] = frame_count
-    
+    for _, record in records:
+        if record is None:
+            continue
+        results["head_pose"].append(record["head_pose"])
+        results["gaze"].append(record["gaze"])
+        if record["blink"]:
+            results["blinks"] += 1
+        if record["speaking"]:
+            results["speaking_frames"] += 1
+        if record["emotion"] is not None:
+            results["emotions"].append(record["emotion"])
+
+    results["total_frames"] = len(records)
+    results["frames_read"] = frames_read
+    results["frame_stride"] = frame_stride
+    results["stage_seconds"] = {k: round(v, 4) for k, v in (timings or {}).items()}
     return results
+
+def analyze_video(video_path, plan=None, frame_count=0, checkpoint_dir=None):
+    """
+    Analyzes a video file to extract head pose, gaze, blink rate, speaking, and emotion.
+    Args:
+        video_path: The path to the video file.
+        plan: Optional AnalysisPlan from media_probe.plan_analysis controlling
+            frame stride, resolution cap, worker count and whether emotion is analyzed.
+        frame_count: Total frame count from the probe, needed to split work across workers.
+        checkpoint_dir: Optional checkpoints.UploadCheckpoint directory; frame records
+            are saved there and a retry of the same upload resumes from them.
+    Returns:
+        A dictionary containing the analysis results.
+    """
+    frame_stride = plan.frame_stride if plan else 1
+    max_height = plan.max_height if plan else None
+    workers = plan.workers if plan and frame_count > 0 else 1
+    analyze_emotion = plan.analyze_emotion if plan else True
+    seekable = plan.seekable if plan else True
+
+    def range_checkpoint(start, end=None):
+        if not checkpoint_dir:
+            return None
+        from checkpoints import frame_checkpoint
+        return frame_checkpoint(checkpoint_dir, start, end, frame_stride, max_height, analyze_emotion)
+
+    if plan and plan.mode == "processes" and plan.workers > 1:
+        from frame_pipeline import analyze_video_multiprocess
+        return analyze_video_multiprocess(video_path, frame_stride=frame_stride, max_height=max_height,
+                                          workers=plan.workers, analyze_emotion=analyze_emotion,
+                                          checkpoint=range_checkpoint(0), seekable=seekable)
+
+    if workers <= 1:
+        # Handlers run concurrently on the threadpool; a fresh mesh keeps requests'
+        # tracking state apart
+        mesh = _new_face_mesh()
+        timings = {}
+        try:
+            records, frames_read = _analyze_range(
+                video_path, 0, None, frame_stride, max_height, mesh,
+                _load_emotion_model() if analyze_emotion else None, timings, range_checkpoint(0), seekable
+            )
+        except IOError:
+            return {"error": "Could not open video file."}
+        finally:
+            mesh.close()
+        return summarize_frames(records, frames_read, frame_stride, timings)
+
+    # Split into stride-aligned chunks; each worker gets its own capture, FaceMesh and net
+    chunk = -(-frame_count // workers)
+    chunk += (-chunk) % frame_stride
+    bounds = [(i * chunk, (i + 1) * chunk if i < workers - 1 else None) for i in range(workers)]
+    logger.info("Analyzing %s in %d parallel chunks of %d frames", video_path, workers, chunk)
+
+    def run_chunk(bound):
+        start, end = bound
+        mesh = _new_face_mesh()
+        timings = {}
+        try:
+            records, frames_read = _analyze_range(
+                video_path, start, end, frame_stride, max_height, mesh,
+                _load_emotion_model() if analyze_emotion else None, timings, range_checkpoint(start, end), seekable
+            )
+            return records, frames_read, timings
+        finally:
+            mesh.close()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(run_chunk, bounds))
+    except IOError:
+        return {"error": "Could not open video file."}
+
+    records = [record for chunk_records, _, _ in chunks for record in chunk_records]
+    frames_read = sum(read for _, read, _ in chunks)
+    timings = {}
+    for _, _, chunk_timings in chunks:
+        for stage, seconds in chunk_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+    return summarize_frames(records, frames_read, frame_stride, timings)
@@ -2,45 +2,104 @@
 """
 Entry point for Hugging Face Spaces deployment.
 This file ensures compatibility with Hugging Face Spaces requirements.
+
+Set SERVER_MODE=production (or WEB_CONCURRENCY=N) to run several worker processes
+under gunicorn with the models preloaded in the master before fork.
 """
 
 import os
 import sys
+import tempfile
+import time
 import logging
 
+import logging_config
+import runtime_config
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+logging_config.configure_logging('app.log')
 logger = logging.getLogger(__name__)
 
+def run_production(host, port, workers, threads):
+    """Runs gunicorn with uvicorn workers and a preloaded application."""
+    from gunicorn.app.base import BaseApplication
+
+    def pre_fork(server, worker):
+        # Give each worker the lowest slot not held by a live worker; the child keys its
+        # log file by it, so restarts reuse files instead of adding one per pid
+        taken = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+        worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+        os.environ["LOG_WORKER_SLOT"] = str(worker.slot)
+
+    def post_fork(server, worker):
+        # Thread pools are not inherited across fork; size the child's pools explicitly
+        runtime_config.set_opencv_threads(threads)
+
+    def child_exit(server, worker):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("timeout", int(os.environ.get("WORKER_TIMEOUT", 180)))
+            self.cfg.set("graceful_timeout", 30)
+            self.cfg.set("accesslog", "-")
+            self.cfg.set("pre_fork", pre_fork)
+            self.cfg.set("post_fork", post_fork)
+            self.cfg.set("child_exit", child_exit)
+
+        def load(self):
+            from main import app
+            runtime_config.preload_models()
+            return app
+
+    ProductionServer().run()
+
 def main():
     """Main entry point for the application"""
     try:
         logger.info("🚀 Starting Interview Analysis API...")
         logger.info(f"Python version: {sys.version}")
         logger.info(f"Working directory: {os.getcwd()}")
-        
-        # Import and run the main application
-        from main import app
-        import uvicorn
-        
+
+        # Size native thread pools before numpy/cv2 are imported
+        workers = runtime_config.worker_count()
+        threads = runtime_config.threads_per_worker(workers)
+        runtime_config.apply_thread_limits(threads)
+        logger.info(f"🧵 {runtime_config.available_cores()} cores: {workers} worker(s) x {threads} thread(s)")
+
         # Get port from environment (Hugging Face Spaces uses 7860)
         port = int(os.environ.get("PORT", 7860))
         host = os.environ.get("HOST", "0.0.0.0")
-        
+
         logger.info(f"🌐 Starting server on {host}:{port}")
-        
+
+        if workers > 1:
+            # Workers write metrics to shared files so /metrics covers all of them
+            if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+                os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+            run_production(host, port, workers, threads)
+            return
+
+        # Import and run the main application
+        import_start = time.perf_counter()
+        from main import app
+        import uvicorn
+        logger.info(f"📦 Imported application in {time.perf_counter() - import_start:.3f}s")
+
         # Start the server
         uvicorn.run(
-            app, 
-            host=host, 
-            port=port, 
+            app,
+            host=host,
+            port=port,
             log_level="info",
             access_log=True
         )
-        
+
     except Exception as e:
         logger.error(f"❌ Failed to start application: {e}")
         raise
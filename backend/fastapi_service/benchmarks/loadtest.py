@@ -0,0 +1,408 @@
+"""
+End-to-end load test for the analysis API.
+
+Usage (from backend/fastapi_service):
+  python -m benchmarks.loadtest --concurrency 4 --requests 40
+  python -m benchmarks.loadtest --rate 2 --duration 60 --concurrency 16 --output benchmarks/results/load.json
+  python -m benchmarks.loadtest --url http://127.0.0.1:7860 --rate 1.5 --duration 120
+
+Without --url the app is started in-process (uvicorn in a background thread, one
+worker) with SPEECH_RECOGNIZER=stub and checkpoints disabled. With --url it targets
+a running server; start that one with SPEECH_RECOGNIZER=stub and
+CHECKPOINT_ENABLED=false too, otherwise identical uploads resume from checkpoints
+and transcription goes to Google.
+
+Without --rate the test is closed-loop: --concurrency clients send back to back.
+With --rate, arrivals are Poisson at that many requests per second and latency is
+measured from the scheduled arrival, so time spent waiting for a free client
+(at most --concurrency in flight) counts against the server.
+
+Peak RSS is sampled from the process side with psutil while the test runs: the
+server process and all of its descendants (gunicorn workers, frame pipeline
+processes, ffmpeg), each with its own peak, plus the peak of their sum. The root is
+this process for the in-process server (so the load generator is included), or
+--server-pid / the process listening on the --url port. /livez is not used, because
+a busy worker cannot answer it and it reports nothing for child processes.
+"""
+
+import argparse
+import json
+import math
+import mimetypes
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+import requests
+
+from benchmarks import synthetic_media
+
+ENDPOINTS = {
+    "analyze": "/analyze-video",
+    "transcribe": "/api/interview/analyze-video",
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def _seconds(value):
+    return f"{value:.3f}s" if value is not None else "-"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class InProcessServer:
+    """Runs main.app with uvicorn in a daemon thread."""
+
+    def __init__(self):
+        os.environ.setdefault("SPEECH_RECOGNIZER", "stub")
+        os.environ.setdefault("CHECKPOINT_ENABLED", "false")
+        import uvicorn
+        import main
+
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="loadtest-server", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("In-process server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/readyz", timeout=5).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def find_server_pid(url):
+    """Returns the pid listening on a local URL's port, or None if it cannot be determined."""
+    import psutil
+
+    parsed = urlparse(url)
+    if parsed.hostname not in ("127.0.0.1", "localhost", "0.0.0.0", "::1"):
+        return None
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        connections = psutil.net_connections(kind="tcp")
+    except psutil.AccessDenied:
+        return None
+    pids = {c.pid for c in connections if c.status == psutil.CONN_LISTEN and c.laddr and c.laddr.port == port and c.pid}
+    if not pids:
+        return None
+    # Workers inherit the listening socket; report from the process at the top of the tree
+    for pid in pids:
+        try:
+            if psutil.Process(pid).ppid() not in pids:
+                return pid
+        except psutil.NoSuchProcess:
+            continue
+    return min(pids)
+
+
+class RssSampler(threading.Thread):
+    """Polls the RSS of a process tree and keeps each process's peak and the peak total."""
+
+    def __init__(self, root_pid, interval):
+        super().__init__(name="loadtest-rss", daemon=True)
+        import psutil
+
+        self.psutil = psutil
+        self.root = psutil.Process(root_pid)
+        self.interval = interval
+        self.peaks = {}
+        self.names = {}
+        self.peak_total = 0
+        self.stop_event = threading.Event()
+
+    def sample(self):
+        try:
+            processes = [self.root, *self.root.children(recursive=True)]
+        except self.psutil.NoSuchProcess:
+            return
+        total = 0
+        for process in processes:
+            try:
+                rss = process.memory_info().rss
+                if process.pid not in self.names:
+                    self.names[process.pid] = " ".join(process.cmdline()[:3])[:80] or process.name()
+            except (self.psutil.NoSuchProcess, self.psutil.AccessDenied):
+                continue
+            total += rss
+            self.peaks[process.pid] = max(self.peaks.get(process.pid, 0), rss)
+        self.peak_total = max(self.peak_total, total)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=5)
+        self.sample()
+
+
+class LoadGenerator:
+    def __init__(self, url, endpoint, video_path, timeout):
+        self.url = url + ENDPOINTS[endpoint]
+        self.endpoint = endpoint
+        self.timeout = timeout
+        with open(video_path, "rb") as f:
+            self.payload = f.read()
+        self.filename = os.path.basename(video_path)
+        self.content_type = mimetypes.guess_type(video_path)[0] or "application/octet-stream"
+        self.local = threading.local()
+        self.results = []
+        self.lock = threading.Lock()
+
+    def _session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def send(self, number, scheduled=None):
+        """Sends one upload; latency counts from `scheduled` when given (open-loop)."""
+        started = time.perf_counter()
+        result = {"request": number, "status": None, "error": None, "quality_tier": None}
+        if self.endpoint == "analyze":
+            files = {"video_file": (self.filename, self.payload, self.content_type)}
+            data = {"userId": "loadtest", "sessionId": f"loadtest-{number}", "questionIndex": "0",
+                    "questionText": "Tell me about yourself"}
+        else:
+            files = {"video": (self.filename, self.payload, self.content_type)}
+            data = None
+        try:
+            response = self._session().post(self.url, files=files, data=data, timeout=self.timeout,
+                                            headers={"X-Request-ID": f"loadtest-{number}"})
+            result["status"] = response.status_code
+            result["quality_tier"] = response.headers.get("X-Quality-Tier")
+        except requests.RequestException as e:
+            result["error"] = type(e).__name__
+        result["latency"] = time.perf_counter() - (scheduled if scheduled is not None else started)
+        result["client_wait"] = started - scheduled if scheduled is not None else 0.0
+        with self.lock:
+            self.results.append(result)
+
+    def closed_loop(self, concurrency, total, duration):
+        counter = iter(range(total if total else sys.maxsize))
+        counter_lock = threading.Lock()
+        deadline = time.perf_counter() + duration if duration else None
+
+        def client():
+            while deadline is None or time.perf_counter() < deadline:
+                with counter_lock:
+                    number = next(counter, None)
+                if number is None:
+                    return
+                self.send(number)
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def open_loop(self, rate, concurrency, total, duration, rng):
+        start = time.perf_counter()
+        next_arrival = start
+        number = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while (not total or number < total) and (not duration or next_arrival - start < duration):
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, number, next_arrival)
+                number += 1
+                next_arrival += rng.expovariate(rate)
+
+
+def summarize(results, wall_seconds):
+    latencies = sorted(r["latency"] for r in results if r["status"] is not None and r["status"] < 400)
+    statuses, tiers = {}, {}
+    for r in results:
+        key = str(r["status"]) if r["status"] is not None else (r["error"] or "error")
+        statuses[key] = statuses.get(key, 0) + 1
+        if r["quality_tier"]:
+            tiers[r["quality_tier"]] = tiers.get(r["quality_tier"], 0) + 1
+    total = len(results)
+    rejected = sum(1 for r in results if r["status"] == 429)
+    errors = sum(1 for r in results if r["status"] is None or (r["status"] >= 400 and r["status"] != 429))
+    client_waits = sorted(r["client_wait"] for r in results)
+    return {
+        "requests": total,
+        "succeeded": len(latencies),
+        "duration_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": latencies[-1] if latencies else None,
+        },
+        "client_wait_p95_seconds": percentile(client_waits, 0.95),
+        "status_counts": statuses,
+        "error_rate": errors / total if total else 0.0,
+        "rate_429": rejected / total if total else 0.0,
+        "quality_tiers": tiers,
+    }
+
+
+def run(args):
+    from benchmarks.run_benchmarks import _metadata
+
+    paths = synthetic_media.generate_case(args.media_dir, f"load_{args.width}x{args.height}_{args.seconds}s",
+                                          args.width, args.height, args.seconds, args.fps, args.codec)
+    video = paths["video"] or paths["silent_video"]
+    if video is None:
+        print(f"Codec {args.codec} is not available in this OpenCV build", file=sys.stderr)
+        return 2
+    if not paths["video"]:
+        print("ffmpeg not found: uploading a clip without audio, transcription will be skipped", file=sys.stderr)
+
+    server = None if args.url else InProcessServer()
+    try:
+        if server:
+            server.__enter__()
+        url = args.url.rstrip("/") if args.url else server.url
+        if not args.no_wait_ready and not wait_ready(url, args.ready_timeout):
+            print(f"{url} did not become ready within {args.ready_timeout}s", file=sys.stderr)
+            return 2
+
+        generator = LoadGenerator(url, args.endpoint, video, args.timeout)
+        sampler = None
+        try:
+            root_pid = os.getpid() if server else (args.server_pid or find_server_pid(url))
+            if root_pid:
+                sampler = RssSampler(root_pid, args.rss_interval)
+                sampler.start()
+            else:
+                print("Could not find the server process; pass --server-pid to report RSS", file=sys.stderr)
+        except ImportError:
+            print("psutil is not installed; RSS is not reported", file=sys.stderr)
+        except Exception as e:  # psutil.NoSuchProcess / AccessDenied
+            print(f"Cannot sample RSS of the server process: {e}", file=sys.stderr)
+        mode = "open" if args.rate else "closed"
+        print(f"Load test: {mode}-loop, concurrency {args.concurrency}"
+              + (f", {args.rate} req/s" if args.rate else "") + f" against {url}{ENDPOINTS[args.endpoint]}")
+        start = time.perf_counter()
+        if args.rate:
+            generator.open_loop(args.rate, args.concurrency, args.requests, args.duration, random.Random(args.seed))
+        else:
+            generator.closed_loop(args.concurrency, args.requests, args.duration)
+        wall_seconds = time.perf_counter() - start
+        if sampler:
+            sampler.stop()
+    finally:
+        if server:
+            server.__exit__(None, None, None)
+
+    report = {
+        "meta": _metadata(),
+        "config": {
+            "target": args.url or "in-process",
+            "endpoint": ENDPOINTS[args.endpoint],
+            "mode": mode,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "requests": args.requests,
+            "duration": args.duration,
+            "upload": {"width": args.width, "height": args.height, "seconds": args.seconds, "fps": args.fps,
+                       "codec": args.codec, "bytes": len(generator.payload)},
+            "seed": args.seed,
+        },
+        "summary": summarize(generator.results, wall_seconds),
+        "processes": {
+            str(pid): {"command": sampler.names.get(pid, ""), "peak_rss_bytes": peak}
+            for pid, peak in sorted(sampler.peaks.items())
+        } if sampler else {},
+        "peak_total_rss_bytes": sampler.peak_total if sampler else None,
+    }
+    if args.include_requests:
+        report["requests"] = sorted(generator.results, key=lambda r: r["request"])
+
+    summary = report["summary"]
+    latency = summary["latency_seconds"]
+    print(f"{summary['succeeded']}/{summary['requests']} succeeded, {summary['throughput_rps']} req/s, "
+          f"p50 {_seconds(latency['p50'])} p95 {_seconds(latency['p95'])} p99 {_seconds(latency['p99'])}, "
+          f"errors {summary['error_rate']:.1%}, 429 {summary['rate_429']:.1%}")
+    for pid, process in report["processes"].items():
+        print(f"  {pid} {process['command']}: peak RSS {process['peak_rss_bytes'] / 2**20:.0f} MiB")
+    if report["peak_total_rss_bytes"]:
+        print(f"  peak total RSS {report['peak_total_rss_bytes'] / 2**20:.0f} MiB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Report written to {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the analysis API with synthetic uploads")
+    parser.add_argument("--url", help="Target a running server instead of starting one in-process")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="analyze",
+                        help="analyze: /analyze-video (full pipeline); transcribe: /api/interview/analyze-video")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum requests in flight")
+    parser.add_argument("--rate", type=float, help="Poisson arrival rate in requests/s (default: closed loop)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests")
+    parser.add_argument("--duration", type=float, default=0, help="Stop issuing requests after this many seconds")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--seconds", type=int, default=10, help="Length of the synthetic upload")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--codec", choices=sorted(synthetic_media.CODECS), default="vp80")
+    parser.add_argument("--media-dir", default=os.path.join(tempfile.gettempdir(), "autoapply-bench-media"))
+    parser.add_argument("--rss-interval", type=float, default=0.5, help="Seconds between RSS samples")
+    parser.add_argument("--server-pid", type=int,
+                        help="Root pid of the --url server (e.g. the gunicorn master); found from the port if omitted")
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--no-wait-ready", action="store_true", help="Do not wait for /readyz before starting")
+    parser.add_argument("--include-requests", action="store_true", help="Include every request in the report")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(SERVICE_DIR, "benchmarks", "results", "loadtest.json"))
+    args = parser.parse_args()
+
+    if not args.requests and not args.duration:
+        args.requests = 10 * args.concurrency
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
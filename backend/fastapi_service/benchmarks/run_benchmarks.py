@@ -0,0 +1,228 @@
+"""
+Reproducible benchmarks for the analysis pipeline stages.
+
+Usage (from backend/fastapi_service):
+  python -m benchmarks.run_benchmarks run [--quick] [--output benchmarks/baselines/<name>.json]
+  python -m benchmarks.run_benchmarks compare <baseline.json> <current.json> [--threshold 0.10]
+
+`run` generates synthetic media offline (cached in --media-dir), times each stage
+separately and writes a JSON result file. `compare` reports the median ratio per
+stage and exits with status 1 if any stage is slower than the baseline by more
+than the threshold.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+import numpy as np
+
+from benchmarks import synthetic_media
+
+# name: (width, height, seconds, fps, codec)
+CASES = {
+    "360p_10s_mp4v": (640, 360, 10, 30, "mp4v"),
+    "720p_10s_mp4v": (1280, 720, 10, 30, "mp4v"),
+    "720p_30s_vp80": (1280, 720, 30, 30, "vp80"),
+    "1080p_10s_mjpg": (1920, 1080, 10, 30, "mjpg"),
+}
+QUICK_CASES = ["360p_10s_mp4v"]
+
+
+def measure(fn, repeat=5, number=1):
+    """Runs fn `number` times per sample, `repeat` samples; returns seconds per call."""
+    fn()  # warm-up, not recorded
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=SERVICE_DIR)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _metadata():
+    import cv2
+    return {
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "emotion_backend": os.environ.get("EMOTION_BACKEND", "opencv"),
+    }
+
+
+def _synthetic_landmarks(seed=0):
+    """468 plausible normalized landmarks, for timing the landmark math without a detected face."""
+    rng = np.random.default_rng(seed)
+    points = rng.normal(0.5, 0.08, size=(468, 3))
+    return SimpleNamespace(landmark=[SimpleNamespace(x=p[0], y=p[1], z=p[2] * 0.1) for p in points])
+
+
+def _first_landmarks(video_path):
+    """Landmarks from the first frame of the clip with a detected face, if any."""
+    import cv2
+    import analysis
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        for _ in range(30):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            result = analysis.get_face_mesh().process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if result.multi_face_landmarks:
+                return result.multi_face_landmarks[0], frame.shape, True
+    finally:
+        cap.release()
+    return _synthetic_landmarks(), (720, 1280, 3), False
+
+
+def bench_case(name, spec, media_dir, results):
+    import main
+    import analysis
+    import emotion_backend
+    from media_probe import probe_media, plan_analysis
+    from model_store import ModelStoreError
+    from stub_recognizer import StubRecognizer
+
+    width, height, seconds, fps, codec = spec
+    paths = synthetic_media.generate_case(media_dir, name, width, height, seconds, fps, codec)
+    video = paths["video"] or paths["silent_video"]
+    if video is None:
+        print(f"  skipping {name}: codec {codec} not available in this OpenCV build")
+        return
+
+    def record(stage, timing, **extra):
+        timing.update(extra)
+        results[f"{name}/{stage}"] = timing
+        print(f"  {name}/{stage}: median {timing['median'] * 1000:.3f} ms")
+
+    record("probe_media", measure(lambda: probe_media(video), repeat=5))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if paths["video"]:
+            wav = os.path.join(tmp, "out.wav")
+            record("extract_audio_from_video", measure(lambda: main.extract_audio_from_video(paths["video"], wav), repeat=3))
+        recognizer = StubRecognizer(latency=0)
+        record("transcribe_audio_stub", measure(lambda: main.transcribe_audio(paths["audio"], recognizer), repeat=3))
+
+    landmarks, shape, detected = _first_landmarks(video)
+    record("get_gaze_direction", measure(lambda: analysis.get_gaze_direction(landmarks, shape), repeat=5, number=200),
+           detected_face=detected)
+    record("get_blink_rate", measure(lambda: analysis.get_blink_rate(landmarks), repeat=5, number=500), detected_face=detected)
+    record("is_speaking", measure(lambda: analysis.is_speaking(landmarks), repeat=5, number=500), detected_face=detected)
+
+    info = probe_media(video)
+    plan = plan_analysis(info)
+    try:
+        model = emotion_backend.create_emotion_model()
+    except ModelStoreError as e:
+        # Recorded under a different name so it is never compared with a run that had the model
+        print(f"  skipping emotion stages for {name}: {e}")
+        plan.analyze_emotion = False
+    else:
+        tensor = emotion_backend.preprocess_face(np.random.default_rng(0).integers(0, 256, (96, 96), dtype=np.uint8))
+        record("emotion_inference", measure(lambda: model.predict(tensor), repeat=5, number=100))
+
+    stage = "analyze_video" if plan.analyze_emotion else "analyze_video_no_emotion"
+    record(stage, measure(lambda: analysis.analyze_video(video, plan, info.frame_count), repeat=3),
+           frame_stride=plan.frame_stride, workers=plan.workers)
+
+
+def run(args):
+    cases = QUICK_CASES if args.quick else list(CASES)
+    if args.case:
+        cases = args.case
+    results = {}
+    for name in cases:
+        print(f"Benchmarking {name}...")
+        bench_case(name, CASES[name], args.media_dir, results)
+
+    report = {"meta": _metadata(), "results": results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'stage':<48}{'baseline ms':>13}{'current ms':>13}{'change':>9}")
+    for key in sorted(set(baseline) & set(current)):
+        before, after = baseline[key]["median"], current[key]["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<48}{before * 1000:>13.3f}{after * 1000:>13.3f}{change:>+9.1%}{flag}")
+
+    for key in sorted(set(baseline) - set(current)):
+        print(f"{key:<48} missing from current run")
+
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analysis pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks and write a JSON result file")
+    run_parser.add_argument("--quick", action="store_true", help="Only run the smallest case")
+    run_parser.add_argument("--case", action="append", choices=sorted(CASES), help="Run only this case (repeatable)")
+    run_parser.add_argument("--media-dir", default=os.path.join(tempfile.gettempdir(), "autoapply-bench-media"))
+    run_parser.add_argument("--output", default=os.path.join(SERVICE_DIR, "benchmarks", "results", "latest.json"))
+
+    compare_parser = sub.add_parser("compare", help="Compare two result files and flag regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown, e.g. 0.10 for 10%%")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Offline generator for benchmark media: face clips written with cv2.VideoWriter and
+speech-like WAV files, optionally muxed together with ffmpeg.
+
+Output is fully determined by the arguments (fixed seeds), so baselines recorded on
+one machine can be regenerated bit-for-bit on another with the same OpenCV build.
+"""
+
+import os
+import shutil
+import subprocess
+import wave
+
+import cv2
+import numpy as np
+
+# (fourcc, container extension, audio codec used when muxing)
+CODECS = {
+    "mp4v": ("mp4v", ".mp4", "aac"),
+    "mjpg": ("MJPG", ".avi", "pcm_s16le"),
+    "vp80": ("VP80", ".webm", "libopus"),
+}
+
+SAMPLE_RATE = 16000
+
+
+def _write_wav(path, samples, rate=SAMPLE_RATE):
+    pcm = np.clip(samples, -1.0, 1.0)
+    pcm = (pcm * 32767).astype(np.int16)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+
+
+def speech_envelope(seconds, rate=SAMPLE_RATE, seed=0):
+    """Syllable-rate (~4 Hz) amplitude envelope with pauses between phrases."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) ** 0.5
+    # Phrases of 1.5-3 s separated by 0.4-1 s of silence
+    gate = np.zeros_like(t)
+    position = 0.0
+    while position < seconds:
+        length = rng.uniform(1.5, 3.0)
+        gate[(t >= position) & (t < position + length)] = 1.0
+        position += length + rng.uniform(0.4, 1.0)
+    return envelope * gate
+
+
+def generate_speech_wav(path, seconds, rate=SAMPLE_RATE, seed=0):
+    """Harmonic voiced source with a drifting pitch, shaped by a speech-like envelope."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    f0 = 150 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voiced = sum((0.6 / k) * np.sin(k * phase) for k in range(1, 6))
+    noise = 0.02 * rng.standard_normal(len(t))
+    _write_wav(path, 0.8 * voiced * speech_envelope(seconds, rate, seed) + noise, rate)
+    return path
+
+
+def _draw_face(canvas, frame_index, fps, mouth_open):
+    h, w = canvas.shape[:2]
+    # Slow sway so tracking and pose change between frames
+    cx = int(w / 2 + 0.05 * w * np.sin(frame_index / fps * 0.8))
+    cy = int(h / 2 + 0.03 * h * np.sin(frame_index / fps * 0.5))
+    fw, fh = int(0.18 * w), int(0.32 * h)
+
+    cv2.ellipse(canvas, (cx, cy), (fw, fh), 0, 0, 360, (150, 180, 225), -1)
+    blinking = (frame_index % int(3 * fps)) < max(1, int(0.12 * fps))
+    for side in (-1, 1):
+        ex, ey = cx + side * int(0.4 * fw), cy - int(0.25 * fh)
+        cv2.ellipse(canvas, (ex, ey - int(0.12 * fh)), (int(0.25 * fw), int(0.04 * fh)), 0, 180, 360, (40, 50, 60), 3)
+        eye_h = 1 if blinking else int(0.07 * fh)
+        cv2.ellipse(canvas, (ex, ey), (int(0.18 * fw), eye_h), 0, 0, 360, (255, 255, 255), -1)
+        if not blinking:
+            cv2.circle(canvas, (ex, ey), int(0.06 * fh), (60, 40, 30), -1)
+    cv2.line(canvas, (cx, cy - int(0.1 * fh)), (cx - int(0.08 * fw), cy + int(0.15 * fh)), (110, 130, 170), 3)
+    mouth_h = max(2, int(mouth_open * 0.12 * fh))
+    cv2.ellipse(canvas, (cx, cy + int(0.5 * fh)), (int(0.35 * fw), mouth_h), 0, 0, 360, (60, 60, 150), -1)
+
+
+def _paste_face(canvas, face, frame_index, fps):
+    h, w = canvas.shape[:2]
+    fh = int(0.7 * h)
+    fw = int(face.shape[1] * fh / face.shape[0])
+    resized = cv2.resize(face, (fw, fh))
+    x = int((w - fw) / 2 + 0.05 * w * np.sin(frame_index / fps * 0.8))
+    y = int((h - fh) / 2)
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(w, x + fw), min(h, y + fh)
+    canvas[y0:y1, x0:x1] = resized[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+def generate_face_clip(path, width, height, seconds, fps=30, codec="mp4v", face_image=None, seed=0):
+    """
+    Writes a clip of a drawn face (or a moving still from `face_image`) whose mouth
+    follows a speech-like envelope and which blinks every 3 seconds.
+    Returns the path written, or None if this OpenCV build lacks the codec.
+    """
+    fourcc, _, _ = CODECS[codec]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+    if not writer.isOpened():
+        return None
+
+    face = cv2.imread(face_image) if face_image else None
+    envelope = speech_envelope(seconds, rate=fps, seed=seed)
+    background = np.full((height, width, 3), (70, 90, 80), dtype=np.uint8)
+    try:
+        for i in range(int(seconds * fps)):
+            canvas = background.copy()
+            if face is not None:
+                _paste_face(canvas, face, i, fps)
+            else:
+                _draw_face(canvas, i, fps, envelope[min(i, len(envelope) - 1)])
+            writer.write(canvas)
+    finally:
+        writer.release()
+    return path
+
+
+def mux_audio(video_path, audio_path, output_path, codec="mp4v"):
+    """Adds an audio track with ffmpeg. Returns None when ffmpeg is unavailable or fails."""
+    if not shutil.which("ffmpeg"):
+        return None
+    _, _, audio_codec = CODECS[codec]
+    cmd = ["ffmpeg", "-v", "error", "-y", "-i", video_path, "-i", audio_path,
+           "-c:v", "copy", "-c:a", audio_codec, "-shortest", output_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    return output_path if result.returncode == 0 else None
+
+
+def generate_case(out_dir, name, width, height, seconds, fps=30, codec="mp4v", face_image=None):
+    """
+    Generates one benchmark case: a silent clip, a speech-like WAV and, when ffmpeg is
+    present, the clip with that audio muxed in. Existing files are reused.
+    Returns a dict of paths (values are None for anything that could not be produced).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    _, ext, _ = CODECS[codec]
+    silent = os.path.join(out_dir, f"{name}.silent{ext}")
+    audio = os.path.join(out_dir, f"{name}.wav")
+    muxed = os.path.join(out_dir, f"{name}{ext}")
+
+    if not os.path.exists(silent):
+        silent = generate_face_clip(silent, width, height, seconds, fps, codec, face_image)
+    if not os.path.exists(audio):
+        generate_speech_wav(audio, seconds)
+    if silent and not os.path.exists(muxed):
+        muxed = mux_audio(silent, audio, muxed, codec)
+
+    return {"silent_video": silent, "audio": audio, "video": muxed if muxed and os.path.exists(muxed) else None}
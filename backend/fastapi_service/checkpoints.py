@@ -0,0 +1,274 @@
+"""
+Per-upload stage checkpoints, so a retried request resumes instead of starting over.
+
+Checkpoints are keyed by the SHA-256 of the uploaded bytes and kept in a local
+scratch directory, one sub-directory per upload:
+
+  audio.wav                   the extracted PCM audio
+  transcript.json             the transcription, once a recognizer succeeded
+  frames-<plan>-<start>-<end>.jsonl
+                              frame records of one analysis range, appended as they
+                              are produced and ended by a completion line
+
+Frame files are named after the plan settings that affect the records (stride,
+height cap, emotion on/off) and the range's bounds, so neither a retry under a
+different quality tier nor one split into different chunks reuses records that do
+not belong to it. A whole-video range ends in "end", whether it ran sequentially
+or through the process pipeline, since both produce the same records. On resume,
+records are trusted up to the last contiguous sampled frame and analysis continues
+from the next one.
+
+A directory is locked while a request uses it; a concurrent retry of the same
+upload simply runs without checkpoints. Directories untouched for CHECKPOINT_TTL
+seconds are removed by a sweep that runs at most every CHECKPOINT_SWEEP_INTERVAL.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+from model_store import atomic_write
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_ENABLED = os.environ.get("CHECKPOINT_ENABLED", "true").lower() in ("1", "true", "yes")
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "interview-checkpoints"))
+CHECKPOINT_TTL = float(os.environ.get("CHECKPOINT_TTL", 24 * 3600))
+CHECKPOINT_SWEEP_INTERVAL = float(os.environ.get("CHECKPOINT_SWEEP_INTERVAL", 600))
+CHECKPOINT_FLUSH_FRAMES = int(os.environ.get("CHECKPOINT_FLUSH_FRAMES", 50))
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_last_sweep = 0.0
+
+
+def copy_and_hash(source, destination) -> str:
+    """Copies a file object to another while hashing it; returns the hex SHA-256."""
+    digest = hashlib.sha256()
+    while True:
+        chunk = source.read(COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        destination.write(chunk)
+    return digest.hexdigest()
+
+
+def _try_lock(path: str):
+    """Opens and exclusively locks `path` without blocking; returns the file or None if held."""
+    lock_file = open(path, "a")
+    if fcntl:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+    return lock_file
+
+
+class UploadCheckpoint:
+    """Stage results saved for one upload. Use open_checkpoint() to obtain one."""
+
+    def __init__(self, key: str, path: str, lock_file):
+        self.key = key
+        self.path = path
+        self._lock_file = lock_file
+
+    @property
+    def audio_path(self) -> str:
+        return os.path.join(self.path, "audio.wav")
+
+    def has_audio(self) -> bool:
+        return os.path.exists(self.audio_path) and os.path.getsize(self.audio_path) > 0
+
+    def save_audio(self, wav_path: str):
+        tmp_path = self.audio_path + ".tmp"
+        try:
+            shutil.copyfile(wav_path, tmp_path)
+            os.replace(tmp_path, self.audio_path)
+        except OSError as e:
+            logger.warning("Could not checkpoint audio for %s: %s", self.key, e)
+
+    def load_transcript(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "transcript.json")) as f:
+                return json.load(f)["text"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_transcript(self, text: str):
+        try:
+            atomic_write(os.path.join(self.path, "transcript.json"), json.dumps({"text": text}).encode("utf-8"))
+        except OSError as e:
+            logger.warning("Could not checkpoint transcript for %s: %s", self.key, e)
+
+    def close(self):
+        """Releases the lock so a later retry can use the checkpoint."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def open_checkpoint(key: str) -> Optional[UploadCheckpoint]:
+    """
+    Opens (creating if needed) and locks the checkpoint directory for an upload.
+    Args:
+        key: The upload's SHA-256.
+    Returns:
+        An UploadCheckpoint, or None when checkpoints are disabled, unavailable or
+        already in use by another request for the same upload.
+    """
+    if not CHECKPOINT_ENABLED:
+        return None
+    _maybe_sweep()
+    path = os.path.join(CHECKPOINT_DIR, key)
+    try:
+        os.makedirs(path, exist_ok=True)
+        lock_file = _try_lock(os.path.join(path, ".lock"))
+        if lock_file is None:
+            logger.info("Checkpoint %s is in use by another request, running without it", key)
+            return None
+        # The directory mtime is the TTL clock
+        os.utime(path)
+    except OSError as e:
+        logger.warning("Checkpoint directory unavailable: %s", e)
+        return None
+    return UploadCheckpoint(key, path, lock_file)
+
+
+def sweep(now: Optional[float] = None) -> int:
+    """Removes checkpoint directories older than CHECKPOINT_TTL; returns how many were removed."""
+    now = now or time.time()
+    removed = 0
+    try:
+        entries = list(os.scandir(CHECKPOINT_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if not entry.is_dir() or now - entry.stat().st_mtime < CHECKPOINT_TTL:
+                continue
+            lock_file = _try_lock(os.path.join(entry.path, ".lock"))
+            if lock_file is None:
+                continue
+            try:
+                shutil.rmtree(entry.path)
+                removed += 1
+            finally:
+                lock_file.close()
+        except OSError as e:
+            logger.warning("Could not remove expired checkpoint %s: %s", entry.path, e)
+    if removed:
+        logger.info("Removed %d expired checkpoints", removed)
+    return removed
+
+
+def _maybe_sweep():
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep >= CHECKPOINT_SWEEP_INTERVAL:
+        _last_sweep = now
+        sweep(now)
+
+
+class FrameCheckpoint:
+    """
+    Append-only record log for one analysis range starting at frame `start`.
+    Args:
+        path: The .jsonl file.
+        start: First frame index of the range.
+        frame_stride: Sampling stride, used to find the contiguous prefix on resume.
+    """
+
+    def __init__(self, path: str, start: int, frame_stride: int, flush_every: int = CHECKPOINT_FLUSH_FRAMES):
+        self.path = path
+        self.start = start
+        self.frame_stride = frame_stride
+        self.flush_every = max(1, flush_every)
+        self._file = None
+        self._pending = 0
+
+    def load(self) -> Tuple[List[Tuple[int, Dict[str, Any]]], int, Optional[int]]:
+        """
+        Reads saved records and rewrites the file to the usable prefix.
+        Returns:
+            The records of the contiguous prefix in frame order, the frame index to
+            resume from, and the range's frames read if it had completed (else None).
+        """
+        saved, frames_read = {}, None
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn last line from an interrupted write
+                    if "frames_read" in entry:
+                        frames_read = entry["frames_read"]
+                    else:
+                        saved[entry["frame"]] = entry["record"]
+        except OSError:
+            pass
+
+        records = []
+        resume = self.start + (-self.start) % self.frame_stride
+        while resume in saved:
+            records.append((resume, saved[resume]))
+            resume += self.frame_stride
+
+        if frames_read is not None and len(records) == len(saved):
+            return records, resume, frames_read
+
+        self._file = open(self.path, "w")
+        for frame_index, record in records:
+            self._write(frame_index, record)
+        self._file.flush()
+        if records:
+            logger.info("Resuming frame analysis at frame %d from %s", resume, self.path)
+        return records, resume, None
+
+    def _write(self, frame_index: int, record: Optional[Dict[str, Any]]):
+        self._file.write(json.dumps({"frame": frame_index, "record": record}, default=float) + "\n")
+
+    def append(self, frame_index: int, record: Optional[Dict[str, Any]]):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._write(frame_index, record)
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._file.flush()
+            self._pending = 0
+
+    def complete(self, frames_read: int):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps({"frames_read": frames_read}) + "\n")
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def frame_checkpoint(directory: Optional[str], start: int, end: Optional[int], frame_stride: int,
+                     max_height: Optional[int], analyze_emotion: bool) -> Optional[FrameCheckpoint]:
+    """
+    Returns the FrameCheckpoint for the analysis range [start, end) under a plan, or
+    None without a directory. `end` is None for a range that runs to the end of the video.
+    """
+    if not directory:
+        return None
+    bounds = f"{start}-{end if end is not None else 'end'}"
+    name = f"frames-s{frame_stride}-h{max_height or 0}-e{int(analyze_emotion)}-{bounds}.jsonl"
+    return FrameCheckpoint(os.path.join(directory, name), start, frame_stride)
@@ -0,0 +1,129 @@
+"""
+Compares accuracy and latency of the emotion model across inference backends.
+
+Usage:
+  python compare_emotion_backends.py [--faces DIR] [--samples 200] [--output report.json]
+
+--faces points at a directory with one sub-directory per emotion label
+(neutral, happiness, ...) containing face crops; accuracy is reported when it is
+given. Without it, random crops are used and only agreement with the reference
+(the first configuration, OpenCV fp32) is reported.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+import emotion_backend
+from emotion_backend import EMOTIONS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+CONFIGURATIONS = [
+    ("opencv", "fp32"),
+    ("onnxruntime", "fp32"),
+    ("onnxruntime", "int8"),
+]
+
+def load_faces(faces_dir, limit):
+    """Returns (tensors, labels); labels are None for unlabeled synthetic input."""
+    import cv2
+
+    if not faces_dir:
+        rng = np.random.default_rng(0)
+        crops = rng.integers(0, 256, size=(limit, 96, 96), dtype=np.uint8)
+        return [emotion_backend.preprocess_face(c) for c in crops], None
+
+    tensors, labels = [], []
+    for label in EMOTIONS:
+        label_dir = os.path.join(faces_dir, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for name in sorted(os.listdir(label_dir)):
+            image = cv2.imread(os.path.join(label_dir, name), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            tensors.append(emotion_backend.preprocess_face(image))
+            labels.append(EMOTIONS.index(label))
+            if len(tensors) >= limit:
+                return tensors, labels
+    return tensors, labels
+
+def run_configuration(backend, variant, tensors, threads, warmup=10):
+    model = emotion_backend.create_emotion_model(backend, variant, threads)
+    for tensor in tensors[:warmup]:
+        model.predict(tensor)
+
+    predictions, latencies = [], []
+    for tensor in tensors:
+        start = time.perf_counter()
+        scores = model.predict(tensor)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(int(np.argmax(scores)))
+    return predictions, np.array(latencies)
+
+def compare(tensors, labels, threads):
+    report = {"samples": len(tensors), "threads": threads, "labeled": labels is not None, "results": []}
+    reference = None
+
+    for backend, variant in CONFIGURATIONS:
+        if variant != "fp32" and not os.path.exists(emotion_backend.model_path(variant)):
+            logger.warning(f"Skipping {backend}/{variant}: run quantize_model.py first")
+            continue
+        try:
+            predictions, latencies = run_configuration(backend, variant, tensors, threads)
+        except ImportError as e:
+            logger.warning(f"Skipping {backend}/{variant}: {e}")
+            continue
+
+        if reference is None:
+            reference = predictions
+        result = {
+            "backend": backend,
+            "variant": variant,
+            "latency_ms": {
+                "mean": round(float(latencies.mean()), 3),
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p95": round(float(np.percentile(latencies, 95)), 3),
+            },
+            "agreement_with_reference": round(float(np.mean(np.array(predictions) == np.array(reference))), 4),
+        }
+        if labels is not None:
+            result["accuracy"] = round(float(np.mean(np.array(predictions) == np.array(labels))), 4)
+        report["results"].append(result)
+    return report
+
+def print_report(report):
+    print(f"\n{'backend':<14}{'variant':<9}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'agree':>8}{'acc':>8}")
+    for r in report["results"]:
+        accuracy = f"{r['accuracy']:.3f}" if "accuracy" in r else "-"
+        print(f"{r['backend']:<14}{r['variant']:<9}{r['latency_ms']['mean']:>9.3f}{r['latency_ms']['p50']:>9.3f}"
+              f"{r['latency_ms']['p95']:>9.3f}{r['agreement_with_reference']:>8.3f}{accuracy:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--faces", help="Directory of labeled face crops")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    tensors, labels = load_faces(args.faces, args.samples)
+    if not tensors:
+        sys.exit("No face crops found")
+    report = compare(tensors, labels, args.threads)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.output}")
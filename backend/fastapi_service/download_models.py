@@ -1,8 +1,11 @@
-import requests
+import argparse
+import json
 import os
 import sys
 import logging
 
+from model_store import DEFAULT_MANIFEST, ModelStore, ModelSpec, ModelStoreError, atomic_write, get_store, sha256_file
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,31 +18,54 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def download_file(url, dir_path, file_name):
-    """Downloads a file from a URL."""
-    os.makedirs(dir_path, exist_ok=True)
-    file_path = os.path.join(dir_path, file_name)
-    
-    if os.path.exists(file_path):
-        logger.info(f"{file_name} already exists. Skipping download.")
-        return
+def download_file(url, dir_path, file_name, sha256=None, size=None):
+    """Downloads a file from a URL, resuming partial downloads and verifying it."""
+    spec = ModelSpec(name=file_name, url=url, sha256=sha256, size=size)
+    store = ModelStore(cache_dir=dir_path, manifest={file_name: spec})
 
-    logger.info(f"Downloading {file_name}...")
+    logger.info(f"Ensuring {file_name} is available...")
     try:
-        r = requests.get(url, stream=True)
-        r.raise_for_status()
-        with open(file_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-        logger.info(f"File downloaded successfully to {file_path}")
-
-    except requests.exceptions.RequestException as e:
+        file_path = store.ensure(file_name)
+        logger.info(f"File available at {file_path}")
+    except ModelStoreError as e:
         logger.error(f"Error downloading file: {e}")
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
 
 
+def pin_manifest(store, names, manifest_path=DEFAULT_MANIFEST):
+    """Records the SHA-256 and size of the cached copies of `names` in the manifest file."""
+    with open(manifest_path) as f:
+        data = json.load(f)
+    for entry in data.get("models", []):
+        if entry["name"] in names:
+            path = store.path(entry["name"])
+            entry["sha256"] = sha256_file(path)
+            entry["size"] = os.path.getsize(path)
+            logger.info(f"Pinned {entry['name']}: sha256 {entry['sha256']}, {entry['size']} bytes")
+    atomic_write(manifest_path, (json.dumps(data, indent=2) + "\n").encode())
+
+
 if __name__ == "__main__":
-    # No models needed for basic transcription service
-    # This script is kept for future expansion
-    logger.info("No models are required for the transcription service. This script is kept for future use.")
\ No newline at end of file
+    # Fetch and verify every model listed in models_manifest.json into MODEL_CACHE_DIR
+    parser = argparse.ArgumentParser(description="Download and verify the models in the manifest")
+    parser.add_argument("--pin", action="store_true",
+                        help="Write the SHA-256 and size of unpinned downloads into the manifest")
+    args = parser.parse_args()
+
+    # Pinning has to fetch the unpinned models first, so it cannot insist on pins
+    store = ModelStore(require_pinned=False) if args.pin else get_store()
+    if not store.manifest:
+        logger.info("No models listed in the manifest.")
+    failed = False
+    for name in store.manifest:
+        try:
+            logger.info(f"{name}: {store.ensure(name)}")
+        except ModelStoreError as e:
+            logger.error(f"{name}: {e}")
+            failed = True
+    if args.pin and not failed:
+        unpinned = [name for name, spec in store.manifest.items() if spec.sha256 is None or spec.size is None]
+        if unpinned:
+            pin_manifest(store, unpinned)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,145 @@
+"""
+Selectable inference backends for the FER+ emotion model.
+
+EMOTION_BACKEND chooses the runtime ("opencv" or "onnxruntime") and
+EMOTION_MODEL_VARIANT chooses the weights ("fp32" or the "int8" file produced
+by quantize_model.py). Unknown or unavailable settings fall back to OpenCV fp32.
+"""
+
+import os
+import threading
+import logging
+
+import numpy as np
+
+from model_store import get_store
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = {
+    "fp32": "emotion-ferplus-8.onnx",
+    "int8": "emotion-ferplus-8.int8.onnx",
+}
+BACKENDS = ("opencv", "onnxruntime")
+
+# FER+ output classes, in model output order
+EMOTIONS = ["neutral", "happiness", "surprise", "sadness", "anger", "disgust", "fear", "contempt"]
+
+
+def model_path(variant: str = "fp32") -> str:
+    return get_store().path(MODEL_FILES.get(variant, MODEL_FILES["fp32"]))
+
+
+def configured_backend() -> str:
+    backend = os.environ.get("EMOTION_BACKEND", "opencv").lower()
+    if backend not in BACKENDS:
+        logger.warning(f"Unknown EMOTION_BACKEND '{backend}', using opencv")
+        return "opencv"
+    return backend
+
+
+def configured_variant() -> str:
+    variant = os.environ.get("EMOTION_MODEL_VARIANT", "fp32").lower()
+    if variant not in MODEL_FILES:
+        logger.warning(f"Unknown EMOTION_MODEL_VARIANT '{variant}', using fp32")
+        return "fp32"
+    return variant
+
+
+def preprocess_face(gray_face):
+    """
+    Converts a grayscale face crop into the 1x1x64x64 float32 tensor the model expects.
+    """
+    import cv2
+    resized_face = cv2.resize(gray_face, (64, 64))
+    processed_face = resized_face.astype(np.float32) / 255.0
+    return processed_face.reshape(1, 1, 64, 64)
+
+
+class OpenCVEmotionModel:
+    """cv2.dnn backend. A Net is not thread-safe, so create one per thread."""
+
+    name = "opencv"
+
+    def __init__(self, buffer):
+        import cv2
+        self.net = cv2.dnn.readNetFromONNX(buffer)
+
+    def predict(self, tensor):
+        self.net.setInput(tensor)
+        return self.net.forward()
+
+
+class OnnxRuntimeEmotionModel:
+    """ONNX Runtime CPU backend. Sessions are thread-safe and shared per process."""
+
+    name = "onnxruntime"
+
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads or 1
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, tensor):
+        return self.session.run(None, {self.input_name: tensor})[0]
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def read_model(variant: str = "fp32"):
+    """
+    Returns the model as a uint8 array over a read-only memory map from the model
+    store, downloading and verifying it on first use.
+    """
+    return np.frombuffer(get_store().open(MODEL_FILES[variant]), dtype=np.uint8)
+
+
+def _threads() -> int:
+    configured = os.environ.get("EMOTION_THREADS")
+    if configured:
+        return max(1, int(configured))
+    import runtime_config
+    return runtime_config.current_thread_budget()
+
+
+def create_emotion_model(backend: str = None, variant: str = None, threads: int = None):
+    """
+    Returns an emotion model usable from the calling thread.
+    Args:
+        backend: "opencv" or "onnxruntime"; defaults to EMOTION_BACKEND.
+        variant: "fp32" or "int8"; defaults to EMOTION_MODEL_VARIANT.
+        threads: Intra-op threads for ONNX Runtime; defaults to EMOTION_THREADS or the worker budget.
+    Returns:
+        An object with a predict(tensor) method returning the raw model scores.
+    """
+    backend = backend or configured_backend()
+    variant = variant or configured_variant()
+
+    if variant != "fp32" and not os.path.exists(model_path(variant)):
+        logger.warning(f"{MODEL_FILES[variant]} not found, using fp32 weights")
+        variant = "fp32"
+
+    if backend == "onnxruntime":
+        key = (os.getpid(), variant, threads)
+        with _sessions_lock:
+            if key not in _sessions:
+                try:
+                    if variant == "fp32":
+                        get_store().ensure(MODEL_FILES[variant])
+                    _sessions[key] = OnnxRuntimeEmotionModel(model_path(variant), threads or _threads())
+                    logger.info(f"Loaded ONNX Runtime emotion model ({variant})")
+                except ImportError:
+                    logger.error("onnxruntime is not installed, falling back to OpenCV")
+                    backend = "opencv"
+            if backend == "onnxruntime":
+                return _sessions[key]
+
+    return OpenCVEmotionModel(read_model(variant))
@@ -0,0 +1,325 @@
+"""
+Multi-process frame analysis over a shared-memory ring buffer.
+
+One decoder process reads (and downscales) frames into fixed-size slots of a
+`multiprocessing.shared_memory` block and hands out slot indices; N analysis
+processes view their slot in place (no pickling of pixel data), run the per-frame
+measurements from analysis.analyze_frame, and return only the small per-frame
+record. Records are put back in frame order before being summarized.
+
+Frames are dispatched to workers in contiguous blocks so that each worker's
+FaceMesh keeps tracking between neighbouring frames instead of re-detecting.
+
+If a child dies without reporting (OOM kill, native crash), the slots it held are
+never freed and the decoder would block forever, so the parent fails the run as
+soon as it sees such an exit. Children log through a queue to the parent, which
+writes their records with its own handlers.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import logging_config
+import runtime_config
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = int(os.environ.get("PIPELINE_BLOCK_SIZE", 16))
+SLOTS_PER_WORKER = int(os.environ.get("PIPELINE_SLOTS_PER_WORKER", 4))
+# How often the parent checks for children that died without reporting
+POLL_INTERVAL = float(os.environ.get("PIPELINE_POLL_INTERVAL", 1))
+# How long a child that exited cleanly may take to deliver its last messages
+EXIT_GRACE = 5 * POLL_INTERVAL
+
+# Serializes the environment swap around starting children (see _start_single_threaded)
+_spawn_lock = threading.Lock()
+
+
+def _attach(name):
+    """
+    Attaches to the parent's block. Spawned children share the parent's resource
+    tracker, where the block is already registered, so attaching adds nothing to clean
+    up; unregistering here would drop the parent's entry and make its unlink fail.
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+def _slot_view(shm, slot, slot_shape):
+    slot_bytes = int(np.prod(slot_shape))
+    return np.ndarray(slot_shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+
+
+def _drain(results):
+    """Yields the messages already in `results` without blocking."""
+    while True:
+        try:
+            yield results.get_nowait()
+        except queue.Empty:
+            return
+
+
+def _decoder_main(video_path, shm_name, slot_shape, frame_stride, max_height,
+                  free_slots, work_queues, results, log_queue, start=0, seekable=True):
+    """Decodes sampled frames into free slots and dispatches them to workers in blocks."""
+    logging_config.forward_to_parent(log_queue)
+    import cv2
+    from media_probe import open_at_frame
+
+    shm = _attach(shm_name)
+    cap = open_at_frame(video_path, start, seekable)
+    frames_read = start
+    try:
+        if not cap.isOpened():
+            results.put(("error", f"Could not open video file: {video_path}"))
+            return
+
+        slot_h, slot_w, _ = slot_shape
+        sampled = 0
+        while True:
+            if frames_read % frame_stride:
+                if not cap.grab():
+                    break
+                frames_read += 1
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            h, w = frame.shape[:2]
+            if max_height and h > max_height:
+                scale = max_height / float(h)
+                frame = cv2.resize(frame, (int(w * scale), max_height), interpolation=cv2.INTER_AREA)
+            h, w = frame.shape[:2]
+            if h > slot_h or w > slot_w:
+                # Stream changed resolution mid-file; fit it into the slot
+                scale = min(slot_h / float(h), slot_w / float(w))
+                frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+                h, w = frame.shape[:2]
+
+            slot = free_slots.get()
+            _slot_view(shm, slot, slot_shape)[:h, :w] = frame
+            worker = (sampled // BLOCK_SIZE) % len(work_queues)
+            work_queues[worker].put((slot, frames_read, h, w))
+            sampled += 1
+            frames_read += 1
+    except Exception as e:
+        results.put(("error", f"Decoder failed: {e}"))
+    finally:
+        cap.release()
+        for work_queue in work_queues:
+            work_queue.put(None)
+        results.put(("decoded", frames_read))
+        shm.close()
+
+
+def _worker_main(worker_index, shm_name, slot_shape, analyze_emotion, work_queue, free_slots, results, log_queue):
+    """Analyzes frames in place in their slots and returns the per-frame records."""
+    logging_config.forward_to_parent(log_queue)
+    shm = _attach(shm_name)
+    timings = {}
+    try:
+        import cv2
+        import analysis
+        cv2.setNumThreads(1)
+        mesh = analysis.get_face_mesh()
+        emotion_model = analysis._load_emotion_model() if analyze_emotion else None
+
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            slot, frame_index, h, w = item
+            frame = _slot_view(shm, slot, slot_shape)[:h, :w]
+            try:
+                record = analysis.analyze_frame(frame, mesh, emotion_model, timings)
+            finally:
+                free_slots.put(slot)
+            results.put(("frame", frame_index, record))
+    except Exception as e:
+        results.put(("error", f"Analysis worker failed: {e}"))
+    finally:
+        results.put(("done", worker_index, timings))
+        shm.close()
+
+
+def _start_single_threaded(processes):
+    """
+    Starts spawned children with one native thread each; parallelism comes from the
+    process count. BLAS/OpenMP read their variables when numpy is first imported, which
+    a spawned child does while unpickling its target, so they must be in the
+    environment it inherits rather than set from inside it.
+    """
+    with _spawn_lock:
+        saved = {var: os.environ.get(var) for var in runtime_config.THREAD_ENV_VARS}
+        try:
+            for var in runtime_config.THREAD_ENV_VARS:
+                os.environ[var] = "1"
+            for process in processes:
+                process.start()
+        finally:
+            for var, value in saved.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+
+def _frame_size(video_path):
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        cap.release()
+
+
+def analyze_video_multiprocess(video_path, width=0, height=0, frame_stride=1, max_height=None,
+                               workers=2, analyze_emotion=True, checkpoint=None, seekable=True):
+    """
+    Analyzes a video with one decoder process and `workers` analysis processes.
+    Args:
+        video_path: The path to the video file.
+        width, height: Source resolution, used to size the ring buffer slots. Read from
+            the container when not given.
+        frame_stride: Analyze every n-th frame.
+        max_height: Downscale frames taller than this before analysis.
+        workers: Number of analysis processes.
+        analyze_emotion: Whether to run the emotion model.
+        checkpoint: Optional checkpoints.FrameCheckpoint to resume from and append to.
+        seekable: Whether the resume frame can be reached by seeking (see media_probe.open_at_frame).
+    Returns:
+        The same result dictionary as analysis.analyze_video.
+    """
+    from analysis import summarize_frames
+
+    records, resume = [], 0
+    if checkpoint is not None:
+        records, resume, frames_read = checkpoint.load()
+        if frames_read is not None:
+            return summarize_frames(records, frames_read, frame_stride)
+
+    if not width or not height:
+        width, height = _frame_size(video_path)
+    if not width or not height:
+        if checkpoint is not None:
+            checkpoint.close()
+        return {"error": "Could not open video file."}
+    if max_height and height > max_height:
+        width, height = int(width * max_height / float(height)), max_height
+    slot_shape = (max(1, height), max(1, width), 3)
+    slots = max(2, workers * SLOTS_PER_WORKER)
+
+    ctx = multiprocessing.get_context("spawn")
+    shm = shared_memory.SharedMemory(create=True, size=slots * int(np.prod(slot_shape)))
+    free_slots = ctx.Queue()
+    for slot in range(slots):
+        free_slots.put(slot)
+    work_queues = [ctx.Queue() for _ in range(workers)]
+    results = ctx.Queue()
+    log_queue = ctx.Queue()
+
+    processes = [ctx.Process(
+        target=_decoder_main, name="frame-decoder",
+        args=(video_path, shm.name, slot_shape, frame_stride, max_height, free_slots, work_queues, results,
+              log_queue, resume, seekable),
+        daemon=True,
+    )]
+    processes += [ctx.Process(
+        target=_worker_main, name=f"frame-worker-{i}",
+        args=(i, shm.name, slot_shape, analyze_emotion, work_queues[i], free_slots, results, log_queue),
+        daemon=True,
+    ) for i in range(workers)]
+
+    start = time.perf_counter()
+    frames_read = 0
+    timings = {}
+    error = None
+    finished = False
+    done_workers, decoder_done = set(), False
+
+    def handle(message):
+        """Applies one child message; returns an error string if the run failed."""
+        nonlocal frames_read, decoder_done
+        kind = message[0]
+        if kind == "frame":
+            records.append((message[1], message[2]))
+            if checkpoint is not None:
+                checkpoint.append(message[1], message[2])
+        elif kind == "decoded":
+            frames_read, decoder_done = message[1], True
+        elif kind == "done":
+            done_workers.add(message[1])
+            for stage, seconds in message[2].items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        elif kind == "error":
+            return message[1]
+        return None
+
+    log_listener = logging_config.ChildLogListener(log_queue)
+    try:
+        _start_single_threaded(processes)
+
+        exited_at = {}
+        while len(done_workers) < workers or not decoder_done:
+            try:
+                error = handle(results.get(timeout=POLL_INTERVAL))
+            except queue.Empty:
+                # An exited child's last messages can still be in the pipe; read
+                # everything already there before deciding that it died
+                for message in _drain(results):
+                    error = handle(message)
+                    if error:
+                        break
+                if error:
+                    break
+                decoder, analysis_workers = processes[0], processes[1:]
+                missing = [p for i, p in enumerate(analysis_workers)
+                           if p.exitcode is not None and i not in done_workers]
+                if decoder.exitcode is not None and not decoder_done:
+                    missing.append(decoder)
+                now = time.monotonic()
+                # A non-zero exit means the child was killed or crashed; a clean exit
+                # only fails once its messages are overdue
+                dead = [p for p in missing
+                        if p.exitcode != 0 or now - exited_at.setdefault(p.name, now) > EXIT_GRACE]
+                if dead:
+                    error = ", ".join(f"{p.name} exited with code {p.exitcode} before reporting" for p in dead)
+                    break
+                continue
+            if error:
+                break
+        else:
+            finished = True
+    finally:
+        for process in processes:
+            if process.pid is None:
+                continue
+            # After a failure the decoder may be blocked on a slot that is never freed
+            if not finished:
+                process.terminate()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        shm.close()
+        shm.unlink()
+        log_listener.stop()
+        if checkpoint is not None:
+            if finished:
+                checkpoint.complete(frames_read)
+            checkpoint.close()
+
+    if error:
+        logger.error("Frame pipeline failed: %s", error)
+        return {"error": error}
+
+    records.sort(key=lambda item: item[0])
+    logger.info("Frame pipeline analyzed %d frames with %d workers in %.2fs",
+                len(records), workers, time.perf_counter() - start)
+    return summarize_frames(records, frames_read, frame_stride, timings)
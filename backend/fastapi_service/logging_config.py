@@ -0,0 +1,231 @@
+"""
+Non-blocking logging setup.
+
+Request threads only enqueue records through a QueueHandler; a QueueListener thread
+formats and writes them to stdout and a size-rotated file, so disk I/O never happens
+under the logging lock on the request path. Records carry the current request id.
+
+Environment:
+  LOG_LEVEL         root level (default INFO)
+  LOG_LEVELS        per-logger levels, e.g. "analysis=DEBUG,media_probe=WARNING"
+  LOG_SAMPLING      per-logger sample rates for records below WARNING, e.g. "main=0.1"
+  LOG_FORMAT        "json" (default) or "text"
+  LOG_FILE          log file path (default app.log); empty disables the file.
+                    Forked workers write to "<name>.<slot><ext>", keyed by the worker slot
+                    in LOG_WORKER_SLOT (set by app.py's pre_fork), so rotation never races
+                    and a restarted worker reuses its predecessor's file.
+  LOG_MAX_BYTES     rotate the file at this size (default 10 MB)
+  LOG_BACKUP_COUNT  rotated files to keep (default 5)
+
+Processes started with multiprocessing (the frame pipeline) never open the file:
+configure_logging is a no-op there, and forward_to_parent sends their records back
+through a queue to the parent, where ChildLogListener writes them with its handlers.
+"""
+
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Dict, Optional
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+_listener = None
+_default_file = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps each record with the request id of the context that logged it."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Passes a `rate` fraction of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Defers formatting to the listener thread. Only the message arguments are merged
+    (so mutable args are captured) and tracebacks are rendered to text, because
+    exc_info objects cannot be safely used after the handler returns.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    mapping = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, setting = item.partition("=")
+        if name and setting:
+            mapping[name.strip()] = setting.strip()
+    return mapping
+
+
+def configure_logging(default_file: str = "app.log"):
+    """
+    Installs the queue-based handlers on the root logger. Safe to call more than once.
+    """
+    global _listener, _default_file
+    if _listener is not None:
+        return
+    # A spawned child re-imports the entry module (app.py) and would open the parent's
+    # file a second time; its records are forwarded instead (see forward_to_parent).
+    # The name is already set while the child imports its main module.
+    if multiprocessing.current_process().name != "MainProcess":
+        return
+    first_call = _default_file is None
+    _default_file = default_file
+
+    formatter = JsonFormatter() if os.environ.get("LOG_FORMAT", "json") == "json" else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = os.environ.get("LOG_FILE", default_file)
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+            backupCount=int(os.environ.get("LOG_BACKUP_COUNT", 5)),
+            encoding="utf-8",
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+    for name, level in _parse_mapping(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level.upper())
+    for name, rate in _parse_mapping(os.environ.get("LOG_SAMPLING", "")).items():
+        logging.getLogger(name).addFilter(SamplingFilter(float(rate)))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    if first_call:
+        atexit.register(shutdown_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _restart_in_child():
+    """The writer thread does not survive fork(); start a fresh one with a per-worker file."""
+    global _listener
+    if _listener is None:
+        return
+    _listener = None
+    log_file = os.environ.get("LOG_FILE", _default_file)
+    if log_file:
+        root, ext = os.path.splitext(log_file)
+        # Outside gunicorn there is no slot; fall back to the pid
+        slot = os.environ.pop("LOG_WORKER_SLOT", None) or os.getpid()
+        os.environ["LOG_FILE"] = f"{root}.{slot}{ext}"
+    configure_logging(_default_file)
+
+
+def forward_to_parent(log_queue):
+    """
+    Replaces a multiprocessing child's handlers with one that sends every record
+    through `log_queue` to the parent's ChildLogListener.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_mapping(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+class ChildLogListener:
+    """
+    Writes the records children send with forward_to_parent through this process's
+    loggers, tagged with the request id of the thread that created the listener.
+    Unlike QueueListener it never writes to the queue, so stopping cannot block on a
+    lock held by a child that was terminated mid-put.
+    """
+
+    def __init__(self, log_queue, poll_interval: float = 0.2):
+        self._queue = log_queue
+        self._poll_interval = poll_interval
+        self._request_id = request_id_var.get()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="child-log-listener", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=self._poll_interval)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+            if self._request_id and not hasattr(record, "request_id"):
+                record.request_id = self._request_id
+            logging.getLogger(record.name).handle(record)
+
+    def stop(self):
+        """Returns once everything already queued is written (or after a few polls)."""
+        self._stopped.set()
+        self._thread.join(timeout=5 * self._poll_interval)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -7,22 +7,21 @@ import shutil
 import tempfile
 import logging
 import time
-import traceback
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import subprocess
 import sys
 import uuid
 from datetime import datetime
 
-# Configure logging with more detailed format
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('app.log')
-    ]
-)
+import checkpoints
+import logging_config
+import metrics
+import qos
+import startup
+from media_probe import probe_media, plan_analysis
+
+# Structured, queue-backed logging (see logging_config for LOG_* settings)
+logging_config.configure_logging('app.log')
 logger = logging.getLogger(__name__)
 
 # Define response models
@@ -49,9 +48,13 @@ app.add_middleware(
 # Add middleware for request tracking
 @app.middleware("http")
 async def add_request_id(request: Request, call_next):
-    # Generate a unique ID for each request
-    request_id = str(uuid.uuid4())
-    logger.info(f"Request {request_id} started: {request.method} {request.url.path}")
+    # Reuse the caller's ID when given, otherwise generate one; handlers read it from request.state
+    request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+    request.state.request_id = request_id
+    request.state.upstream_wait = _upstream_wait(request.headers.get("X-Request-Start"))
+    metrics.request_id_var.set(request_id)
+    timings = metrics.start_request_timing()
+    logger.info("Request %s started: %s %s", request_id, request.method, request.url.path)
     
     # Process the request
     start_time = time.time()
@@ -61,10 +64,77 @@ async def add_request_id(request: Request, call_next):
     # Add custom headers to the response
     response.headers["X-Request-ID"] = request_id
     response.headers["X-Process-Time"] = str(process_time)
+    quality_tier = getattr(request.state, "quality_tier", None)
+    if quality_tier:
+        response.headers["X-Quality-Tier"] = quality_tier
+    if request.headers.get("X-Debug-Timing", "").lower() in ("1", "true", "yes") and timings:
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings)
+    
+    # Label by route template, not raw URL, to keep metric cardinality bounded
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.labels(
+        path=getattr(route, "path", "unmatched"), status=str(response.status_code)
+    ).observe(process_time)
     
-    logger.info(f"Request {request_id} completed in {process_time:.3f}s with status {response.status_code}")
+    logger.info("Request %s completed in %.3fs with status %s", request_id, process_time, response.status_code)
     return response
 
+def _upstream_wait(header: Optional[str]) -> float:
+    """
+    Seconds since a proxy accepted the request, from its X-Request-Start header
+    ("t=<epoch>" in seconds, milliseconds or microseconds); 0 when absent or invalid.
+    """
+    if not header:
+        return 0.0
+    try:
+        started = float(header.strip().lstrip("t="))
+    except ValueError:
+        return 0.0
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(0.0, time.time() - started)
+
+async def _mark_dispatch(request: Request):
+    """Runs once the upload is received and parsed, right before the handler is queued on the threadpool."""
+    request.state.dispatched = time.perf_counter()
+
+def _observe_queue_wait(request: Request):
+    """
+    Records how long the request queued: in front of the service (X-Request-Start, when a
+    proxy sets it) plus waiting for a threadpool thread. Upload and multipart parsing
+    time are not included, so slow clients do not look like load.
+    """
+    dispatched = getattr(request.state, "dispatched", None)
+    if dispatched is not None:
+        queue_wait = getattr(request.state, "upstream_wait", 0.0) + time.perf_counter() - dispatched
+        metrics.QUEUE_WAIT_SECONDS.observe(queue_wait)
+        qos.controller.observe_queue_wait(queue_wait)
+
+def _admit(request: Request) -> Optional[JSONResponse]:
+    """Admits the request through the load-shedding controller; returns a 429 response if shed."""
+    try:
+        request.state.quality_tier = qos.controller.admit()
+    except qos.Overloaded as e:
+        logger.warning("Rejecting request %s: %s", request.state.request_id, e)
+        request.state.quality_tier = "rejected"
+        return JSONResponse(
+            status_code=429,
+            content={"error": "Server is overloaded, retry later", "qualityTier": "rejected"},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return None
+
+def _observe_visual_analysis(analysis_results: Dict[str, Any], seconds: float):
+    """Feeds per-frame stage totals and throughput from analyze_video into the metrics."""
+    for stage, stage_seconds in analysis_results.get("stage_seconds", {}).items():
+        metrics.observe_stage(stage, stage_seconds)
+    frames = analysis_results.get("total_frames", 0)
+    metrics.FRAMES_ANALYZED.inc(frames)
+    if frames and seconds > 0:
+        metrics.ANALYSIS_FPS.observe(frames / seconds)
+
 # Check dependencies on startup
 @app.on_event("startup")
 async def startup_event():
@@ -73,51 +143,51 @@ async def startup_event():
     # Check TR environment variable
     tr_path = os.environ.get('TR') or os.environ.get('tr')
     if tr_path:
-        logger.info(f"✓ TR environment variable is set to: {tr_path}")
+        logger.info("✓ TR environment variable is set to: %s", tr_path)
         
         # Add TR to Python path if it exists
         if os.path.exists(tr_path):
             if os.path.join(tr_path, 'Lib', 'site-packages') not in sys.path:
                 sys.path.append(os.path.join(tr_path, 'Lib', 'site-packages'))
-                logger.info(f"✓ Added {os.path.join(tr_path, 'Lib', 'site-packages')} to Python path")
+                logger.info("✓ Added %s to Python path", os.path.join(tr_path, 'Lib', 'site-packages'))
         else:
-            logger.warning(f"⚠️ TR path does not exist: {tr_path}")
+            logger.warning("⚠️ TR path does not exist: %s", tr_path)
     else:
         logger.warning("⚠️ TR environment variable is not set")
     
-    # Check if ffmpeg is available
-    try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
+    # Detect external tools and libraries once; health probes read the cached result
+    capabilities = startup.detect_capabilities()
+    if capabilities["ffmpeg"]:
         logger.info("✓ FFmpeg is available")
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    else:
         logger.error("✗ FFmpeg is not available. Audio extraction will fail.")
     
-    # Try to import required modules
-    try:
-        import speech_recognition as sr
+    if capabilities["speech_recognition"]:
         logger.info("✓ SpeechRecognition is available")
-    except ImportError:
+    else:
         logger.error("✗ SpeechRecognition is not available. Transcription will fail.")
     
-    try:
-        from pydub import AudioSegment
+    if capabilities["pydub"]:
         logger.info("✓ PyDub is available")
-    except ImportError:
+    else:
         logger.error("✗ PyDub is not available. Alternative audio extraction will fail.")
+    
+    # Import and warm the analysis models in the background; /readyz flips once done
+    startup.start_warm_up()
 
 def extract_audio_from_video(video_path: str, audio_path: str) -> bool:
     """Extract audio from video file using ffmpeg"""
     try:
-        logger.info(f"Extracting audio from {video_path} to {audio_path}")
+        logger.info("Extracting audio from %s to %s", video_path, audio_path)
         
         # Check if input file exists
         if not os.path.exists(video_path):
-            logger.error(f"Input video file does not exist: {video_path}")
+            logger.error("Input video file does not exist: %s", video_path)
             return False
         
         # Check file size
         file_size = os.path.getsize(video_path)
-        logger.info(f"Input video file size: {file_size} bytes")
+        logger.debug("Input video file size: %s bytes", file_size)
         
         cmd = [
             'ffmpeg', 
@@ -130,11 +200,13 @@ def extract_audio_from_video(video_path: str, audio_path: str) -> bool:
             audio_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        with metrics.stage("ffmpeg_extract"):
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
         
         if result.returncode != 0:
-            logger.error(f"FFmpeg failed with return code {result.returncode}")
-            logger.error(f"FFmpeg stderr: {result.stderr}")
+            metrics.AUDIO_EXTRACTIONS.labels(method="ffmpeg", outcome="failure").inc()
+            logger.error("FFmpeg failed with return code %s", result.returncode)
+            logger.error("FFmpeg stderr: %s", result.stderr)
             # Try fallback method
             if extract_audio_fallback(video_path, audio_path):
                 logger.info("Audio extraction successful using fallback method")
@@ -143,6 +215,7 @@ def extract_audio_from_video(video_path: str, audio_path: str) -> bool:
         
         # Check if output file was created
         if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
+            metrics.AUDIO_EXTRACTIONS.labels(method="ffmpeg", outcome="failure").inc()
             logger.error("Audio file was not created or is empty")
             # Try fallback method
             if extract_audio_fallback(video_path, audio_path):
@@ -150,10 +223,12 @@ def extract_audio_from_video(video_path: str, audio_path: str) -> bool:
                 return True
             return False
         
-        logger.info(f"Audio extraction successful. Output file size: {os.path.getsize(audio_path)} bytes")
+        metrics.AUDIO_EXTRACTIONS.labels(method="ffmpeg", outcome="success").inc()
+        logger.info("Audio extraction successful. Output file size: %s bytes", os.path.getsize(audio_path))
         return True
         
     except subprocess.TimeoutExpired:
+        metrics.AUDIO_EXTRACTIONS.labels(method="ffmpeg", outcome="timeout").inc()
         logger.error("Audio extraction timed out")
         # Try fallback method
         if extract_audio_fallback(video_path, audio_path):
@@ -161,8 +236,8 @@ def extract_audio_from_video(video_path: str, audio_path: str) -> bool:
             return True
         return False
     except Exception as e:
-        logger.error(f"Unexpected error during audio extraction: {e}")
-        logger.error(traceback.format_exc())
+        metrics.AUDIO_EXTRACTIONS.labels(method="ffmpeg", outcome="failure").inc()
+        logger.exception("Unexpected error during audio extraction: %s", e)
         # Try fallback method
         if extract_audio_fallback(video_path, audio_path):
             logger.info("Audio extraction successful using fallback method")
@@ -172,82 +247,138 @@ def extract_audio_from_video(video_path: str, audio_path: str) -> bool:
 def extract_audio_fallback(video_path, audio_path):
     """Fallback method to extract audio using pydub"""
     try:
-        logger.info(f"Attempting fallback audio extraction with pydub")
+        logger.info("Attempting fallback audio extraction with pydub")
         from pydub import AudioSegment
-        video = AudioSegment.from_file(video_path)
-        video.export(audio_path, format="wav")
+        with metrics.stage("fallback_extract"):
+            video = AudioSegment.from_file(video_path)
+            video.export(audio_path, format="wav")
         if os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
-            logger.info(f"Fallback audio extraction successful. Output file size: {os.path.getsize(audio_path)} bytes")
+            metrics.AUDIO_EXTRACTIONS.labels(method="pydub", outcome="success").inc()
+            logger.info("Fallback audio extraction successful. Output file size: %s bytes", os.path.getsize(audio_path))
             return True
         else:
+            metrics.AUDIO_EXTRACTIONS.labels(method="pydub", outcome="failure").inc()
             logger.error("Fallback audio extraction failed: output file is empty or does not exist")
             return False
     except Exception as e:
-        logger.error(f"Fallback audio extraction failed: {e}")
-        logger.error(traceback.format_exc())
+        metrics.AUDIO_EXTRACTIONS.labels(method="pydub", outcome="failure").inc()
+        logger.exception("Fallback audio extraction failed: %s", e)
         return False
 
-def transcribe_audio(audio_path: str) -> str:
-    """Transcribe audio using speech recognition"""
+def _attempt_transcription(engine: str, recognize, audio_data, **kwargs) -> str:
+    """Runs one recognition engine, timing it and counting the outcome."""
+    try:
+        with metrics.stage(f"transcribe_{engine}"):
+            text = recognize(audio_data, **kwargs)
+    except Exception as e:
+        metrics.TRANSCRIPTION_ATTEMPTS.labels(engine=engine, outcome=type(e).__name__).inc()
+        raise
+    metrics.TRANSCRIPTION_ATTEMPTS.labels(engine=engine, outcome="success").inc()
+    return text
+
+def _create_recognizer():
+    """Returns the configured recognizer; SPEECH_RECOGNIZER=stub selects the offline stub for load tests."""
+    if os.environ.get("SPEECH_RECOGNIZER", "").lower() == "stub":
+        from stub_recognizer import StubRecognizer
+        return StubRecognizer()
+    import speech_recognition as sr
+    return sr.Recognizer()
+
+def transcribe_audio_result(audio_path: str, recognizer=None) -> Tuple[str, bool]:
+    """
+    Transcribe audio using speech recognition.
+    `recognizer` replaces the configured recognizer, e.g. with stub_recognizer.StubRecognizer for benchmarks.
+    Returns the transcription (or a failure message) and whether a recognizer succeeded.
+    """
     try:
         import speech_recognition as sr
-        logger.info(f"Transcribing audio from {audio_path}")
+        logger.info("Transcribing audio from %s", audio_path)
         
         # Check if audio file exists and is not empty
         if not os.path.exists(audio_path):
-            logger.error(f"Audio file does not exist: {audio_path}")
-            return "Audio file not found"
+            logger.error("Audio file does not exist: %s", audio_path)
+            return "Audio file not found", False
         
         file_size = os.path.getsize(audio_path)
         if file_size == 0:
             logger.error("Audio file is empty")
-            return "Audio file is empty"
+            return "Audio file is empty", False
         
-        logger.info(f"Audio file size: {file_size} bytes")
+        logger.debug("Audio file size: %s bytes", file_size)
         
-        recognizer = sr.Recognizer()
+        if recognizer is None:
+            recognizer = _create_recognizer()
         
-        with sr.AudioFile(audio_path) as source:
+        with sr.AudioFile(audio_path) as source, metrics.stage("audio_decode"):
             # Adjust for ambient noise
             recognizer.adjust_for_ambient_noise(source, duration=0.5)
             audio_data = recognizer.record(source)
-            
-            # Try Google Speech Recognition first
+        
+        # Try Google Speech Recognition first
+        try:
+            logger.info("Attempting transcription with Google Speech Recognition")
+            text = _attempt_transcription("google", recognizer.recognize_google, audio_data, language='en-US')
+            logger.info("Google transcription successful: %s characters", len(text))
+            return text, True
+        except sr.UnknownValueError:
+            logger.warning("Google Speech Recognition could not understand audio")
+            # Try with Sphinx as fallback
             try:
-                logger.info("Attempting transcription with Google Speech Recognition")
-                text = recognizer.recognize_google(audio_data, language='en-US')
-                logger.info(f"Google transcription successful: {len(text)} characters")
-                return text
-            except sr.UnknownValueError:
-                logger.warning("Google Speech Recognition could not understand audio")
-                # Try with Sphinx as fallback
-                try:
-                    logger.info("Attempting transcription with Sphinx")
-                    text = recognizer.recognize_sphinx(audio_data)
-                    logger.info(f"Sphinx transcription successful: {len(text)} characters")
-                    return text
-                except Exception as e:
-                    logger.error(f"Sphinx transcription failed: {e}")
-                    return "Could not understand audio (tried multiple engines)"
-            except sr.RequestError as e:
-                logger.error(f"Google Speech Recognition service error: {e}")
-                # Try with Sphinx as fallback
-                try:
-                    logger.info("Attempting transcription with Sphinx as fallback")
-                    text = recognizer.recognize_sphinx(audio_data)
-                    logger.info(f"Sphinx transcription successful: {len(text)} characters")
-                    return text
-                except Exception as sphinx_err:
-                    logger.error(f"Sphinx transcription failed: {sphinx_err}")
-                    return f"Speech recognition service error: {e}"
-                
+                logger.info("Attempting transcription with Sphinx")
+                text = _attempt_transcription("sphinx", recognizer.recognize_sphinx, audio_data)
+                logger.info("Sphinx transcription successful: %s characters", len(text))
+                return text, True
+            except Exception as e:
+                logger.error("Sphinx transcription failed: %s", e)
+                return "Could not understand audio (tried multiple engines)", False
+        except sr.RequestError as e:
+            logger.error("Google Speech Recognition service error: %s", e)
+            # Try with Sphinx as fallback
+            try:
+                logger.info("Attempting transcription with Sphinx as fallback")
+                text = _attempt_transcription("sphinx", recognizer.recognize_sphinx, audio_data)
+                logger.info("Sphinx transcription successful: %s characters", len(text))
+                return text, True
+            except Exception as sphinx_err:
+                logger.error("Sphinx transcription failed: %s", sphinx_err)
+                return f"Speech recognition service error: {e}", False
+            
     except ImportError as e:
-        logger.error(f"SpeechRecognition library not available: {e}")
-        return "Speech recognition library not available"
+        logger.error("SpeechRecognition library not available: %s", e)
+        return "Speech recognition library not available", False
     except Exception as e:
-        logger.error(f"Error transcribing audio: {e}")
-        logger.error(traceback.format_exc())
-        return f"Error transcribing audio: {e}"
+        logger.exception("Error transcribing audio: %s", e)
+        return f"Error transcribing audio: {e}", False
+
+def transcribe_audio(audio_path: str, recognizer=None) -> str:
+    """Transcribe audio using speech recognition; returns the text or a failure message."""
+    return transcribe_audio_result(audio_path, recognizer)[0]
+
+def _transcribe_video(video_path: str, audio_path: str,
+                      checkpoint: Optional[checkpoints.UploadCheckpoint]) -> Tuple[Optional[str], List[str]]:
+    """
+    Extracts and transcribes the audio of a video, reusing and saving checkpointed stages.
+    Returns the transcription (None if audio extraction failed) and the stages resumed from checkpoints.
+    """
+    resumed = []
+    if checkpoint:
+        transcript = checkpoint.load_transcript()
+        if transcript is not None:
+            return transcript, ["transcription"]
+        if checkpoint.has_audio():
+            audio_path = checkpoint.audio_path
+            resumed.append("audio")
+
+    if not resumed:
+        if not extract_audio_from_video(video_path, audio_path):
+            return None, resumed
+        if checkpoint:
+            checkpoint.save_audio(audio_path)
+
+    transcription, recognized = transcribe_audio_result(audio_path)
+    if recognized and checkpoint:
+        checkpoint.save_transcript(transcription)
+    return transcription, resumed
 
 @app.get("/")
 def read_root():
@@ -256,33 +387,46 @@ def read_root():
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
-    try:
-        # Check required libraries
-        import speech_recognition
-        return {
-            "status": "healthy",
-            "message": "API is running",
-            "dependencies": {
-                "ffmpeg": check_ffmpeg(),
-                "speech_recognition": True
-            }
-        }
-    except ImportError as e:
-        logger.error(f"Health check failed: {e}")
+    capabilities = startup.detect_capabilities()
+    dependencies = {
+        "ffmpeg": capabilities["ffmpeg"],
+        "speech_recognition": capabilities["speech_recognition"]
+    }
+    if not capabilities["speech_recognition"]:
+        logger.error("Health check failed: speech_recognition is not installed")
         return JSONResponse(
             status_code=503,
             content={
                 "status": "unhealthy", 
-                "message": f"Missing dependencies: {str(e)}",
-                "dependencies": {
-                    "ffmpeg": check_ffmpeg(),
-                    "speech_recognition": False
-                }
+                "message": "Missing dependencies: speech_recognition",
+                "dependencies": dependencies
             }
         )
-
-@app.post("/api/interview/analyze-video", response_model=VideoAnalysisResponse)
-async def analyze_video(video: UploadFile = File(...)):
+    return {
+        "status": "healthy",
+        "message": "API is running",
+        "qos": qos.controller.status(),
+        "ready": startup.is_ready(),
+        "dependencies": dependencies
+    }
+
+@app.get("/livez")
+def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readiness_check():
+    """Readiness probe: capabilities detected and models warmed up"""
+    status = startup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming", **status})
+    return {"status": "ready", **status}
+
+# The analyze handlers are plain functions: FastAPI runs them on its threadpool, so
+# blocking extraction and analysis never hold up the event loop serving the probes
+@app.post("/api/interview/analyze-video", response_model=VideoAnalysisResponse, dependencies=[Depends(_mark_dispatch)])
+def analyze_video(request: Request, video: UploadFile = File(...)):
     """
     Process a video file to extract and transcribe speech:
     1. Save uploaded video
@@ -290,41 +434,68 @@ async def analyze_video(video: UploadFile = File(...)):
     3. Transcribe speech
     4. Return transcription results
     """
-    request_id = str(uuid.uuid4())
-    logger.info(f"[{request_id}] Starting video transcription for file: {video.filename}")
+    request_id = request.state.request_id
+    _observe_queue_wait(request)
+    logger.info("[%s] Starting video transcription for file: %s", request_id, video.filename)
     
+    rejected = _admit(request)
+    if rejected:
+        return rejected
+    metrics.IN_FLIGHT.inc()
+    checkpoint = None
     try:
         # Create temporary directory for processing
         with tempfile.TemporaryDirectory() as temp_dir:
-            logger.info(f"[{request_id}] Created temporary directory: {temp_dir}")
+            logger.debug("[%s] Created temporary directory: %s", request_id, temp_dir)
             
             # Save the uploaded video
             video_path = os.path.join(temp_dir, f"video_{request_id}.mp4")
-            with open(video_path, "wb") as buffer:
-                buffer.write(await video.read())
+            with metrics.stage("upload"):
+                with open(video_path, "wb") as buffer:
+                    upload_hash = checkpoints.copy_and_hash(video.file, buffer)
             
             file_size = os.path.getsize(video_path)
-            logger.info(f"[{request_id}] Saved video file ({file_size} bytes)")
+            logger.info("[%s] Saved video file (%s bytes)", request_id, file_size)
             
             if file_size == 0:
-                logger.error(f"[{request_id}] Uploaded video file is empty")
+                logger.error("[%s] Uploaded video file is empty", request_id)
                 return JSONResponse(
                     status_code=400,
                     content={"error": "Uploaded video file is empty"}
                 )
             
-            # Extract audio from video
+            # Probe the container before doing any expensive work
+            with metrics.stage("probe"):
+                media_info = probe_media(video_path)
+            if not media_info.decodable:
+                logger.error("[%s] Uploaded file is not decodable: %s", request_id, media_info.error)
+                return JSONResponse(
+                    status_code=400,
+                    content={"error": f"Uploaded file could not be decoded: {media_info.error}"}
+                )
+            
+            if not media_info.has_audio:
+                logger.warning("[%s] Upload has no audio stream, skipping transcription", request_id)
+                return {
+                    "transcription": "No audio stream found in upload",
+                    "facial_analysis": {},
+                    "request_id": request_id
+                }
+            
+            # Extract and transcribe audio, resuming from an earlier attempt at the same upload
+            checkpoint = checkpoints.open_checkpoint(upload_hash)
             audio_path = os.path.join(temp_dir, f"audio_{request_id}.wav")
-            if not extract_audio_from_video(video_path, audio_path):
-                logger.error(f"[{request_id}] Failed to extract audio from video")
+            transcription, resumed = _transcribe_video(video_path, audio_path, checkpoint)
+            if transcription is None:
+                logger.error("[%s] Failed to extract audio from video", request_id)
                 return JSONResponse(
                     status_code=500,
                     content={"error": "Failed to extract audio from video"}
                 )
+            if resumed:
+                logger.info("[%s] Resumed from checkpointed stages: %s", request_id, resumed)
             
-            # Transcribe audio
-            transcription = transcribe_audio(audio_path)
-            logger.info(f"[{request_id}] Transcription complete: {transcription[:50]}...")
+            logger.info("[%s] Transcription complete: %s...", request_id, transcription[:50])
             
             # Return results
             response_data = {
@@ -333,26 +504,27 @@ async def analyze_video(video: UploadFile = File(...)):
                 "request_id": request_id
             }
             
-            logger.info(f"[{request_id}] Video transcription complete")
+            logger.info("[%s] Video transcription complete", request_id)
             return response_data
             
     except Exception as e:
-        logger.error(f"[{request_id}] Error processing video: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("[%s] Error processing video: %s", request_id, e)
         return JSONResponse(
             status_code=500,
             content={"error": f"Error processing video: {str(e)}"}
         )
+    finally:
+        metrics.IN_FLIGHT.dec()
+        qos.controller.release()
+        if checkpoint:
+            checkpoint.close()
 
 def check_ffmpeg() -> bool:
-    try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        return True
-    except:
-        return False
+    return startup.detect_capabilities()["ffmpeg"]
 
-@app.exception_handler(Exception)
-async def analyze_video_endpoint(
+@app.post("/analyze-video", dependencies=[Depends(_mark_dispatch)])
+def analyze_video_endpoint(
+    request: Request,
     video_file: UploadFile = File(...),
     userId: str = Form(...),
     sessionId: str = Form(...),
@@ -363,9 +535,10 @@ async def analyze_video_endpoint(
     Analyzes a video file to extract transcription and basic metrics.
     """
 
-    logger.info(f"=== NEW VIDEO ANALYSIS REQUEST ===")
-    logger.info(f"Session: {sessionId}, Question: {questionIndex}, User: {userId}")
-    logger.info(f"Video file: {video_file.filename}, size: {video_file.size if hasattr(video_file, 'size') else 'unknown'}")
+    _observe_queue_wait(request)
+    logger.info("=== NEW VIDEO ANALYSIS REQUEST %s ===", request.state.request_id)
+    logger.info("Session: %s, Question: %s, User: %s", sessionId, questionIndex, userId)
+    logger.info("Video file: %s, size: %s", video_file.filename, video_file.size if hasattr(video_file, 'size') else 'unknown')
 
     # Validate inputs
     if not video_file:
@@ -376,51 +549,77 @@ async def analyze_video_endpoint(
 
     temp_video_path = None
     temp_audio_path = None
+    checkpoint = None
 
+    rejected = _admit(request)
+    if rejected:
+        return rejected
+    metrics.IN_FLIGHT.inc()
     try:
         # Create temporary files
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_video:
-            logger.info("Saving uploaded video to temporary file...")
-            shutil.copyfileobj(video_file.file, temp_video)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_video, metrics.stage("upload"):
+            logger.debug("Saving uploaded video to temporary file...")
+            upload_hash = checkpoints.copy_and_hash(video_file.file, temp_video)
             temp_video_path = temp_video.name
 
         # Verify video file was saved
         if not os.path.exists(temp_video_path) or os.path.getsize(temp_video_path) == 0:
             raise HTTPException(status_code=400, detail="Failed to save uploaded video file")
 
-        logger.info(f"Video saved to: {temp_video_path}, size: {os.path.getsize(temp_video_path)} bytes")
+        logger.info("Video saved to: %s, size: %s bytes", temp_video_path, os.path.getsize(temp_video_path))
+
+        # Step 0: Probe the container and plan the analysis
+        with metrics.stage("probe"):
+            media_info = probe_media(temp_video_path)
+        if not media_info.decodable:
+            raise HTTPException(status_code=400, detail=f"Uploaded file could not be decoded: {media_info.error}")
+        plan = qos.apply_tier(plan_analysis(media_info), media_info, request.state.quality_tier)
+        logger.info("Analysis plan: %s", plan.to_dict())
 
         with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
             temp_audio_path = temp_audio.name
 
-        # Step 1: Extract audio
-        logger.info("Step 1: Extracting audio from video...")
-        audio_extracted = extract_audio_from_video(temp_video_path, temp_audio_path)
-
-        # Step 2: Transcribe audio
-        transcription = ""
-        if audio_extracted and os.path.exists(temp_audio_path):
-            logger.info("Step 2: Transcribing audio...")
-            transcription = transcribe_audio(temp_audio_path)
+        # A retry of the same upload resumes from the stages an earlier attempt finished
+        checkpoint = checkpoints.open_checkpoint(upload_hash)
+        resumed_stages = []
+
+        # Steps 1-2: Extract and transcribe audio
+        if plan.analyze_audio:
+            logger.info("Steps 1-2: Extracting and transcribing audio...")
+            transcription, resumed_stages = _transcribe_video(temp_video_path, temp_audio_path, checkpoint)
+            if transcription is None:
+                logger.warning("Audio extraction failed, skipping transcription")
+                transcription = "Could not extract or transcribe audio"
         else:
-            logger.warning("Audio extraction failed, skipping transcription")
-            transcription = "Could not extract or transcribe audio"
+            transcription = "No audio stream found in upload"
+        if resumed_stages:
+            logger.info("Resumed from checkpointed stages: %s", resumed_stages)
 
         # Step 3: Analyze video
         logger.info("Step 3: Analyzing video for basic metrics...")
         try:
-            from analysis import analyze_video
-            analysis_results = analyze_video(temp_video_path)
+            if not plan.analyze_visual and media_info.has_video:
+                analysis_results = {"error": "Visual analysis skipped under load"}
+            elif not plan.analyze_visual:
+                analysis_results = {"error": "No video stream found in upload"}
+            elif not startup.analysis_available():
+                analysis_results = {"error": "Video analysis module not available"}
+            else:
+                from analysis import analyze_video
+                visual_start = time.perf_counter()
+                with metrics.stage("visual_analysis"):
+                    analysis_results = analyze_video(temp_video_path, plan, media_info.frame_count,
+                                                     checkpoint.path if checkpoint else None)
+                _observe_visual_analysis(analysis_results, time.perf_counter() - visual_start)
         except ImportError:
             logger.error("Analysis module not available")
             analysis_results = {"error": "Video analysis module not available"}
         except Exception as e:
-            logger.error(f"Video analysis failed: {e}")
-            logger.error(traceback.format_exc())
+            logger.exception("Video analysis failed: %s", e)
             analysis_results = {"error": f"Video analysis failed: {str(e)}"}
 
         if "error" in analysis_results:
-            logger.error(f"Video analysis failed: {analysis_results['error']}")
+            logger.error("Video analysis failed: %s", analysis_results['error'])
             # Continue with transcription only
             video_analysis = {
                 "duration": 0,
@@ -442,9 +641,14 @@ async def analyze_video_endpoint(
 
             speaking_percentage = (speaking_frames / total_frames * 100) if total_frames > 0 else 0
 
-            fps = 30
-            duration_minutes = (total_frames / fps) / 60 if total_frames > 0 else 1
-            blinks_per_minute = analysis_results.get("blinks", 0) / duration_minutes if duration_minutes > 0 else 0
+            # Use the container's real timing; frames read covers files whose header lacks a duration
+            frame_stride = analysis_results.get("frame_stride", 1)
+            duration = media_info.duration
+            if not duration and media_info.fps > 0:
+                duration = analysis_results.get("frames_read", 0) / media_info.fps
+            duration_minutes = duration / 60 if duration > 0 else 1
+            # Blinks are counted on sampled frames only, so scale back up by the stride
+            blinks_per_minute = analysis_results.get("blinks", 0) * frame_stride / duration_minutes
 
             gaze_directions = analysis_results.get("gaze", [])
             most_common_gaze = max(set(gaze_directions), key=gaze_directions.count) if gaze_directions else "Unknown"
@@ -453,7 +657,7 @@ async def analyze_video_endpoint(
             most_common_emotion = max(set(emotions), key=emotions.count) if emotions else "Unknown"
 
             video_analysis = {
-                "duration": total_frames / fps if total_frames > 0 else 0,
+                "duration": round(duration, 2),
                 "speaking_percentage": round(speaking_percentage, 2),
                 "blinks_per_minute": round(blinks_per_minute, 2),
                 "dominant_gaze": most_common_gaze,
@@ -471,6 +675,10 @@ async def analyze_video_endpoint(
             "transcription": transcription,
             "videoAnalysis": video_analysis,
             "rawResults": analysis_results if "error" not in analysis_results else {},
+            "mediaInfo": media_info.to_dict(),
+            "analysisPlan": plan.to_dict(),
+            "qualityTier": plan.quality_tier,
+            "resumedStages": resumed_stages,
             "metadata": {
                 "userId": userId,
                 "sessionId": sessionId,
@@ -479,65 +687,48 @@ async def analyze_video_endpoint(
             }
         }
 
-        logger.info(f"Returning response with transcription length: {len(transcription)}")
+        logger.info("Returning response with transcription length: %s", len(transcription))
         return response_data
 
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in analyze_video_endpoint: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Unexpected error in analyze_video_endpoint: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Internal server error: {str(e)}"
         )
 
     finally:
+        metrics.IN_FLIGHT.dec()
+        qos.controller.release()
+        if checkpoint:
+            checkpoint.close()
         # Clean up temporary files
-        logger.info("Cleaning up temporary files...")
+        logger.debug("Cleaning up temporary files...")
         for path in [temp_video_path, temp_audio_path]:
             if path and os.path.exists(path):
                 try:
                     os.unlink(path)
-                    logger.info(f"Deleted temporary file: {path}")
+                    logger.debug("Deleted temporary file: %s", path)
                 except Exception as e:
-                    logger.warning(f"Could not delete temporary file {path}: {e}")
+                    logger.warning("Could not delete temporary file %s: %s", path, e)
 
-def get_video_duration(video_path):
-    """Get video duration in seconds"""
-    try:
-        import cv2
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-        duration = frame_count / fps if fps > 0 else 0
-        cap.release()
-        return duration
-    except:
-        return 30  # Default fallback duration
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics for all pipeline stages"""
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
-    logger.error(f"Unhandled exception: {exc}")
-    logger.error(traceback.format_exc())
+    logger.error("Unhandled exception: %s", exc, exc_info=exc)
     return {"error": "Internal server error", "detail": str(exc)}
 
-
-
-def extract_audio_fallback(video_path, audio_path):
-    try:
-        from pydub import AudioSegment
-        # This requires FFmpeg but might work better
-        video = AudioSegment.from_file(video_path)
-        video.export(audio_path, format="wav")
-        return True
-    except:
-        return False
-    
 if __name__ == "__main__":
     import uvicorn
     # Hugging Face Spaces uses port 7860 by default
     port = int(os.environ.get("PORT", 7860))
-    logger.info(f"Starting FastAPI server on port {port}")
+    logger.info("Starting FastAPI server on port %s", port)
     uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
\ No newline at end of file
@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import subprocess
+from dataclasses import dataclass, field, asdict
+from typing import Optional, List, Dict, Any, Tuple
+
+import runtime_config
+
+logger = logging.getLogger(__name__)
+
+# Planner limits; can be overridden through the environment
+MAX_ANALYSIS_FPS = float(os.environ.get("MAX_ANALYSIS_FPS", 10))
+MAX_ANALYSIS_HEIGHT = int(os.environ.get("MAX_ANALYSIS_HEIGHT", 480))
+PARALLEL_MIN_DURATION = float(os.environ.get("PARALLEL_MIN_DURATION", 60))
+MAX_ANALYSIS_WORKERS = int(os.environ.get("MAX_ANALYSIS_WORKERS", runtime_config.available_cores()))
+# "auto" uses the process pipeline (frame_pipeline.py) for recordings of at least
+# PROCESS_MIN_DURATION seconds; "threads" or "processes" force one mode
+ANALYSIS_MODE = os.environ.get("ANALYSIS_MODE", "auto")
+# Containers whose frame-number seeks are unreliable (MediaRecorder WebM has no cues)
+UNSEEKABLE_FORMATS = ("matroska", "webm")
+PROCESS_MIN_DURATION = float(os.environ.get("PROCESS_MIN_DURATION", 300))
+# Frame rates above this are timebase artefacts, not real rates (MediaRecorder WebM
+# reports r_frame_rate 1000/1), and are treated as unknown
+MAX_PLAUSIBLE_FPS = 240.0
+
+
+@dataclass
+class MediaInfo:
+    """Container metadata gathered by a single up-front probe."""
+    duration: float = 0.0
+    fps: float = 0.0
+    width: int = 0
+    height: int = 0
+    frame_count: int = 0
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    has_video: bool = False
+    has_audio: bool = False
+    format_name: Optional[str] = None
+    decodable: bool = False
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class AnalysisPlan:
+    """Decisions derived from a MediaInfo before any expensive work starts."""
+    analyze_audio: bool = True
+    analyze_visual: bool = True
+    analyze_emotion: bool = True
+    frame_stride: int = 1
+    max_height: Optional[int] = None
+    workers: int = 1
+    mode: str = "threads"
+    seekable: bool = True
+    quality_tier: str = "full"
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def parallel(self) -> bool:
+        return self.workers > 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["parallel"] = self.parallel
+        return data
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """Parses an ffprobe frame rate such as '30000/1001' into a float."""
+    if not rate:
+        return 0.0
+    try:
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(rate)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _plausible_rate(*rates: Optional[str]) -> float:
+    """Returns the first of the ffprobe rates that is a believable frame rate, else 0."""
+    for rate in rates:
+        fps = _parse_rate(rate)
+        if 0 < fps <= MAX_PLAUSIBLE_FPS:
+            return fps
+    return 0.0
+
+
+def _probe_packets(path: str) -> Tuple[int, float]:
+    """
+    Counts the first video stream's packets (one per frame) and measures the span of
+    their timestamps, for containers whose header has no usable rate or duration.
+    Only the demuxer runs, nothing is decoded.
+    Returns:
+        (packets, duration in seconds); (0, 0.0) when ffprobe fails.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time",
+        "-of", "csv=p=0",
+        path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return 0, 0.0
+    if result.returncode != 0:
+        return 0, 0.0
+
+    packets, times = 0, []
+    for line in (result.stdout or "").splitlines():
+        line = line.strip().rstrip(",")
+        if not line:
+            continue
+        packets += 1
+        try:
+            times.append(float(line))
+        except ValueError:
+            pass  # N/A timestamps still count as frames
+    if len(times) < 2:
+        return packets, 0.0
+    # The span covers packets - 1 frame intervals; add the last frame's
+    span = max(times) - min(times)
+    return packets, span * packets / (packets - 1)
+
+
+def _opencv_fps(path: str) -> float:
+    try:
+        import cv2
+    except ImportError:
+        return 0.0
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    finally:
+        cap.release()
+    return fps if 0 < fps <= MAX_PLAUSIBLE_FPS else 0.0
+
+
+def _probe_with_ffprobe(path: str) -> Optional[MediaInfo]:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-print_format", "json",
+        "-show_format",
+        "-show_streams",
+        path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    except FileNotFoundError:
+        return None
+    except subprocess.TimeoutExpired:
+        return MediaInfo(error="ffprobe timed out")
+
+    if result.returncode != 0:
+        return MediaInfo(error=result.stderr.strip() or f"ffprobe exited with {result.returncode}")
+
+    try:
+        data = json.loads(result.stdout or "{}")
+    except ValueError:
+        return MediaInfo(error="ffprobe returned invalid JSON")
+
+    info = MediaInfo()
+    fmt = data.get("format", {})
+    info.format_name = fmt.get("format_name")
+    info.duration = float(fmt.get("duration") or 0.0)
+
+    for stream in data.get("streams", []):
+        codec_type = stream.get("codec_type")
+        if codec_type == "video" and not info.has_video:
+            # Cover art is exposed as a single-frame video stream
+            if stream.get("disposition", {}).get("attached_pic"):
+                continue
+            info.has_video = True
+            info.video_codec = stream.get("codec_name")
+            info.width = int(stream.get("width") or 0)
+            info.height = int(stream.get("height") or 0)
+            info.fps = _plausible_rate(stream.get("avg_frame_rate"), stream.get("r_frame_rate"))
+            info.frame_count = int(stream.get("nb_frames") or 0)
+            if not info.duration:
+                info.duration = float(stream.get("duration") or 0.0)
+        elif codec_type == "audio" and not info.has_audio:
+            info.has_audio = True
+            info.audio_codec = stream.get("codec_name")
+            if not info.duration:
+                info.duration = float(stream.get("duration") or 0.0)
+
+    # MediaRecorder WebM often has no rate, duration or frame count in its header;
+    # derive them from the packets, then from OpenCV's rate
+    if info.has_video and not (info.fps and info.duration):
+        packets, span = _probe_packets(path)
+        if packets:
+            info.frame_count = info.frame_count or packets
+            info.duration = info.duration or span
+            if not info.fps and info.duration:
+                fps = packets / info.duration
+                info.fps = fps if fps <= MAX_PLAUSIBLE_FPS else 0.0
+        if not info.fps:
+            info.fps = _opencv_fps(path)
+
+    # WebM from MediaRecorder usually has no nb_frames; estimate it from the duration
+    if info.has_video and not info.frame_count and info.fps and info.duration:
+        info.frame_count = int(round(info.fps * info.duration))
+
+    info.decodable = info.has_video or info.has_audio
+    if not info.decodable:
+        info.error = "No audio or video streams found"
+    return info
+
+
+def _probe_with_opencv(path: str) -> MediaInfo:
+    """Fallback probe reading container properties through OpenCV (video only)."""
+    info = MediaInfo()
+    try:
+        import cv2
+    except ImportError:
+        info.error = "Neither ffprobe nor OpenCV is available"
+        return info
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            info.error = "Could not open media file"
+            return info
+        info.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if info.fps > MAX_PLAUSIBLE_FPS:
+            info.fps = 0.0
+        info.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        info.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+        info.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+        info.duration = info.frame_count / info.fps if info.fps > 0 else 0.0
+        info.has_video = info.width > 0 and info.height > 0
+        # OpenCV cannot see audio streams; assume one so transcription is still attempted
+        info.has_audio = True
+        info.decodable = info.has_video
+        if not info.decodable:
+            info.error = "No decodable video stream"
+    finally:
+        cap.release()
+    return info
+
+
+def probe_media(path: str) -> MediaInfo:
+    """
+    Probes a media file once for duration, fps, resolution, codecs and stream presence.
+    Args:
+        path: The path to the uploaded media file.
+    Returns:
+        A MediaInfo; `decodable` is False when the file should be rejected.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return MediaInfo(error="Media file is missing or empty")
+
+    info = _probe_with_ffprobe(path)
+    if info is None:
+        logger.warning("ffprobe not available, falling back to OpenCV probe")
+        info = _probe_with_opencv(path)
+
+    logger.info(
+        "Probed %s: decodable=%s video=%s(%sx%s@%.2f) audio=%s duration=%.2fs",
+        os.path.basename(path), info.decodable, info.video_codec, info.width,
+        info.height, info.fps, info.audio_codec, info.duration
+    )
+    return info
+
+
+def open_at_frame(path: str, frame_index: int = 0, seekable: bool = True):
+    """
+    Opens an OpenCV capture positioned exactly at `frame_index`.
+    A frame-number seek is only trusted when the container is seekable and the
+    decoder reports the requested position afterwards; otherwise the file is
+    reopened and the preceding frames are grabbed (decoded without conversion).
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if frame_index <= 0 or not cap.isOpened():
+        return cap
+    if seekable and cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index) \
+            and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return cap
+
+    logger.info("Seeking %s to frame %d by grabbing from the start", path, frame_index)
+    cap.release()
+    cap = cv2.VideoCapture(path)
+    for _ in range(frame_index):
+        if not cap.grab():
+            break
+    return cap
+
+
+def plan_analysis(info: MediaInfo) -> AnalysisPlan:
+    """
+    Chooses frame stride, resolution cap and parallelism for a probed file.
+    Args:
+        info: The MediaInfo returned by probe_media.
+    Returns:
+        An AnalysisPlan.
+    """
+    plan = AnalysisPlan(analyze_audio=info.has_audio, analyze_visual=info.has_video)
+
+    if not info.has_video:
+        plan.reasons.append("audio-only upload, skipping visual analysis")
+        return plan
+    if not info.has_audio:
+        plan.reasons.append("no audio stream, skipping transcription")
+
+    if info.fps > MAX_ANALYSIS_FPS > 0:
+        plan.frame_stride = max(1, int(round(info.fps / MAX_ANALYSIS_FPS)))
+        plan.reasons.append(f"sampling every {plan.frame_stride} frames of {info.fps:.2f} fps")
+
+    if MAX_ANALYSIS_HEIGHT and info.height > MAX_ANALYSIS_HEIGHT:
+        plan.max_height = MAX_ANALYSIS_HEIGHT
+        plan.reasons.append(f"downscaling {info.height}p to {MAX_ANALYSIS_HEIGHT}p")
+
+    plan.seekable = not any(name in (info.format_name or "") for name in UNSEEKABLE_FORMATS)
+
+    if info.duration >= PARALLEL_MIN_DURATION and MAX_ANALYSIS_WORKERS > 1:
+        # Keep at least ~30s of video per worker so seek overhead stays small
+        plan.workers = max(1, min(MAX_ANALYSIS_WORKERS, int(info.duration // 30)))
+        if plan.workers > 1:
+            plan.reasons.append(f"splitting {info.duration:.0f}s across {plan.workers} workers")
+
+    if plan.workers > 1 and ANALYSIS_MODE != "threads" and (
+            ANALYSIS_MODE == "processes" or info.duration >= PROCESS_MIN_DURATION):
+        # Long recordings are worth the process start-up cost; threads stay GIL-bound
+        plan.mode = "processes"
+        plan.reasons.append(f"using the multi-process frame pipeline with {plan.workers} workers")
+    elif plan.workers > 1 and not plan.seekable:
+        # Threaded chunks seek to their start frame; the process pipeline decodes sequentially
+        if ANALYSIS_MODE == "threads":
+            plan.workers = 1
+            plan.reasons.append(f"{info.format_name} cannot seek by frame, analyzing sequentially")
+        else:
+            plan.mode = "processes"
+            plan.reasons.append(f"{info.format_name} cannot seek by frame, using the multi-process frame pipeline")
+
+    return plan
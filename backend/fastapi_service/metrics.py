@@ -0,0 +1,115 @@
+"""
+Prometheus metrics and per-request stage timing.
+
+Every pipeline stage is wrapped in `stage(name)` (or reported with `observe_stage`),
+which feeds the `analysis_stage_seconds` histogram and, while a request is being
+served, that request's timing breakdown. The breakdown is returned as a
+`Server-Timing` header when the client sends `X-Debug-Timing: 1`.
+
+With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR (app.py does this) so
+`/metrics` aggregates all workers instead of reporting whichever one answered.
+"""
+
+import contextlib
+import contextvars
+import os
+import time
+from typing import List, Tuple, Optional
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    generate_latest,
+)
+
+from logging_config import request_id_var
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "analysis_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "analysis_stage_errors_total", "Pipeline stages that raised or reported failure", ["stage"]
+)
+AUDIO_EXTRACTIONS = Counter(
+    "audio_extractions_total", "Audio extraction attempts by method and outcome", ["method", "outcome"]
+)
+TRANSCRIPTION_ATTEMPTS = Counter(
+    "transcription_attempts_total", "Speech recognition attempts by engine and outcome", ["engine", "outcome"]
+)
+FRAMES_ANALYZED = Counter(
+    "frames_analyzed_total", "Video frames run through FaceMesh"
+)
+ANALYSIS_FPS = Histogram(
+    "analysis_frames_per_second", "Analyzed frames per second of visual analysis wall time",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 100, 200, 500)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "request_queue_wait_seconds", "Time a request queued before its handler started (proxy queue plus threadpool wait)",
+    buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Total request latency", ["path", "status"], buckets=STAGE_BUCKETS
+)
+IN_FLIGHT = Gauge(
+    "analysis_in_flight", "Video analyses currently being processed", multiprocess_mode="livesum"
+)
+QUALITY_TIER = Gauge(
+    "analysis_quality_tier", "Current load-shedding tier (0 = full quality)", multiprocess_mode="max"
+)
+QUALITY_TIER_REQUESTS = Counter(
+    "analysis_quality_tier_requests_total", "Analyses admitted per quality tier, or rejected", ["tier"]
+)
+
+_timings_var: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("timings", default=None)
+
+
+def start_request_timing() -> List[Tuple[str, float]]:
+    """Starts collecting the stage breakdown for the current request context."""
+    timings = []
+    _timings_var.set(timings)
+    return timings
+
+
+def observe_stage(name: str, seconds: float, failed: bool = False):
+    """Records a stage duration that was measured elsewhere (e.g. summed per frame)."""
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+    if failed:
+        STAGE_ERRORS.labels(stage=name).inc()
+    timings = _timings_var.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Times the enclosed block as pipeline stage `name`."""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        observe_stage(name, time.perf_counter() - start, failed)
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Formats a breakdown as a Server-Timing header (durations in milliseconds)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+
+def render() -> Tuple[bytes, str]:
+    """Returns the Prometheus exposition payload and its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
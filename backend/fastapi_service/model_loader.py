@@ -1,33 +1,36 @@
-
 import base64
 import os
 
-MODEL_DIR = "models"
+from model_store import get_store, atomic_write
+
 MODEL_NAME = "emotion-ferplus-8.onnx"
-MODEL_PATH = os.path.join(MODEL_DIR, MODEL_NAME)
+MODEL_PATH = get_store().path(MODEL_NAME)
 
 # Placeholder for the base64 encoded model string
 MODEL_BASE64 = ""
 
 def load_model():
     """
-    Decodes the base64 model and writes it to the filesystem if it doesn't exist.
+    Decodes the base64 model and writes it atomically into the model store if it doesn't exist.
     """
-    if os.path.exists(MODEL_PATH):
+    store = get_store()
+    if os.path.exists(MODEL_PATH) and store.verify(MODEL_NAME):
         print(f"{MODEL_NAME} already exists. Skipping creation.")
         return
 
     print(f"Creating {MODEL_NAME} from embedded data...")
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    
+
     if not MODEL_BASE64:
         print("Error: Model data is missing from the script.")
         return
 
     try:
-        model_data = base64.b64decode(MODEL_BASE64)
-        with open(MODEL_PATH, "wb") as f:
-            f.write(model_data)
+        # Temp file + rename, so a crash never leaves a truncated model behind
+        atomic_write(MODEL_PATH, base64.b64decode(MODEL_BASE64))
+        if not store.verify(MODEL_NAME, force=True):
+            os.unlink(MODEL_PATH)
+            print("Error: Embedded model does not match the manifest checksum.")
+            return
         print("Model created successfully.")
     except Exception as e:
         print(f"An error occurred while decoding or writing the model: {e}")
@@ -0,0 +1,277 @@
+"""
+Shared, integrity-checked model artifact store.
+
+Models are described by models_manifest.json (name, url, sha256, size) and cached in
+MODEL_CACHE_DIR, which can be a volume shared by every worker and container on a node.
+Downloads resume with HTTP Range requests into a `.part` file and are renamed into
+place only once complete and verified, so a crash never leaves a file that looks
+finished. The `.part` file's ETag (or Last-Modified) is kept next to it and sent as
+If-Range, so a changed upstream file restarts the download instead of being spliced.
+Checksums are verified lazily: the first verification is recorded in a `.sha256`
+sidecar and re-used while the file's size and mtime are unchanged. Downloaded models
+without a pinned checksum are refused when MODEL_REQUIRE_PINNED is set (the default
+in production). Models are served memory-mapped so processes share one copy through
+the page cache.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", os.path.join(SERVICE_DIR, "models"))
+DEFAULT_MANIFEST = os.environ.get("MODEL_MANIFEST", os.path.join(SERVICE_DIR, "models_manifest.json"))
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 3
+REQUIRE_PINNED = os.environ.get(
+    "MODEL_REQUIRE_PINNED", "1" if os.environ.get("SERVER_MODE", "development") == "production" else "0"
+) == "1"
+
+
+class ModelStoreError(Exception):
+    """Raised when a model cannot be downloaded or fails verification."""
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    url: Optional[str] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+
+
+def load_manifest(path: str = DEFAULT_MANIFEST) -> Dict[str, ModelSpec]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    return {entry["name"]: ModelSpec(**entry) for entry in data.get("models", [])}
+
+
+def sha256_file(path: str, buffer_size: int = DOWNLOAD_BUFFER_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(buffer_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_write(path: str, data: bytes):
+    """Writes `data` to a temp file in the same directory and renames it over `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class ModelStore:
+    """
+    Downloads, verifies and memory-maps model artifacts in a shared cache directory.
+    Args:
+        cache_dir: Directory holding the models; defaults to MODEL_CACHE_DIR.
+        manifest: Mapping of name to ModelSpec; defaults to models_manifest.json.
+        buffer_size: Read/write buffer used for downloads and hashing.
+        require_pinned: Refuse downloadable models whose manifest entry has no sha256;
+            defaults to MODEL_REQUIRE_PINNED.
+    """
+
+    def __init__(self, cache_dir: str = None, manifest: Dict[str, ModelSpec] = None,
+                 buffer_size: int = DOWNLOAD_BUFFER_SIZE, timeout: float = 60,
+                 require_pinned: bool = None):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.manifest = manifest if manifest is not None else load_manifest()
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self.require_pinned = REQUIRE_PINNED if require_pinned is None else require_pinned
+        self._maps = {}
+        self._unpinned_reported = set()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def spec(self, name: str) -> ModelSpec:
+        return self.manifest.get(name) or ModelSpec(name=name)
+
+    @contextlib.contextmanager
+    def _lock(self, name: str):
+        """Serializes downloads of one model across processes sharing the cache."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.path(name) + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _sidecar(self, name: str) -> str:
+        return self.path(name) + ".sha256"
+
+    def verify(self, name: str, force: bool = False) -> bool:
+        """
+        Checks a cached model against its manifest size and SHA-256.
+        The hash is only recomputed when the file changed since the last verification.
+        """
+        spec = self.spec(name)
+        path = self.path(name)
+        if not os.path.exists(path):
+            return False
+
+        stat = os.stat(path)
+        if spec.size is not None and stat.st_size != spec.size:
+            logger.warning(f"{name}: size {stat.st_size} does not match manifest size {spec.size}")
+            return False
+
+        stamp = f"{stat.st_size} {stat.st_mtime_ns}"
+        digest = None
+        if not force and os.path.exists(self._sidecar(name)):
+            with open(self._sidecar(name)) as f:
+                recorded = f.read().split(" ", 1)
+            if len(recorded) == 2 and recorded[1].strip() == stamp:
+                digest = recorded[0]
+
+        if digest is None:
+            digest = sha256_file(path, self.buffer_size)
+            atomic_write(self._sidecar(name), f"{digest} {stamp}\n".encode())
+
+        if spec.sha256 is None:
+            if name not in self._unpinned_reported:
+                self._unpinned_reported.add(name)
+                logger.warning(f"{name}: no pinned checksum in manifest (sha256 {digest})")
+            return True
+        if digest != spec.sha256.lower():
+            logger.error(f"{name}: checksum mismatch, expected {spec.sha256}, got {digest}")
+            return False
+        return True
+
+    def _download(self, spec: ModelSpec):
+        """Resumable download into `<name>.part`; renamed into place after verification."""
+        import requests
+
+        if not spec.url:
+            raise ModelStoreError(f"{spec.name} is not cached and has no download URL")
+
+        part_path = self.path(spec.name) + ".part"
+        validator_path = part_path + ".validator"
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            validator = None
+            if offset and os.path.exists(validator_path):
+                with open(validator_path) as f:
+                    validator = f.read().strip() or None
+            # Without a validator we cannot tell whether the part came from the same file
+            headers = {"Range": f"bytes={offset}-", "If-Range": validator} if validator else {}
+            try:
+                with requests.get(spec.url, headers=headers, stream=True, timeout=self.timeout) as r:
+                    # Nothing left to fetch; verification below decides if the part is good
+                    if r.status_code == 416 and validator:
+                        break
+                    r.raise_for_status()
+                    # 200 means the server ignored the Range or the file changed; start over
+                    resumed = r.status_code == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+                    if resumed:
+                        logger.info(f"Resuming {spec.name} at byte {offset}")
+                    else:
+                        atomic_write(validator_path, (r.headers.get("ETag") or r.headers.get("Last-Modified") or "").encode())
+                    with open(part_path, "ab" if resumed else "wb") as f:
+                        for chunk in r.iter_content(chunk_size=self.buffer_size):
+                            f.write(chunk)
+                        f.flush()
+                        os.fsync(f.fileno())
+                break
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Download of {spec.name} failed (attempt {attempt}/{DOWNLOAD_RETRIES}): {e}")
+                if attempt == DOWNLOAD_RETRIES:
+                    raise ModelStoreError(f"Could not download {spec.name}: {e}") from e
+                time.sleep(attempt)
+
+        size = os.path.getsize(part_path)
+        if spec.size is not None and size != spec.size:
+            self._discard_part(part_path)
+            raise ModelStoreError(f"{spec.name}: downloaded {size} bytes, expected {spec.size}")
+        if spec.sha256 is not None and sha256_file(part_path, self.buffer_size) != spec.sha256.lower():
+            self._discard_part(part_path)
+            raise ModelStoreError(f"{spec.name}: checksum mismatch after download")
+
+        os.replace(part_path, self.path(spec.name))
+        self._discard_part(part_path)
+        logger.info(f"Stored {spec.name} ({size} bytes) in {self.cache_dir}")
+
+    @staticmethod
+    def _discard_part(part_path: str):
+        for path in (part_path, part_path + ".validator"):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def ensure(self, name: str) -> str:
+        """
+        Returns the path of a verified local copy of `name`, downloading it if needed.
+        Names missing from the manifest (e.g. the locally quantized int8 variant) are
+        checked against their sidecar and raise ModelStoreError when not cached.
+        """
+        spec = self.spec(name)
+        # Locally derived models have no URL; anything fetched from the network must be pinned
+        if self.require_pinned and spec.url and spec.sha256 is None:
+            raise ModelStoreError(f"{name}: no pinned sha256 in the manifest; run download_models.py --pin "
+                                  "on a trusted network or set MODEL_REQUIRE_PINNED=0")
+        path = self.path(name)
+        if os.path.exists(path) and self.verify(name):
+            return path
+
+        with self._lock(name):
+            # Another process may have finished the download while we waited
+            if os.path.exists(path):
+                if self.verify(name):
+                    return path
+                logger.warning(f"{name}: discarding corrupt cached copy")
+                os.unlink(path)
+            self._download(self.spec(name))
+            if not self.verify(name, force=True):
+                raise ModelStoreError(f"{name}: verification failed after download")
+        return path
+
+    def open(self, name: str) -> mmap.mmap:
+        """
+        Returns a read-only memory map of the model. Mappings are cached per process
+        and, being backed by the page cache, shared between processes on the node.
+        """
+        key = (os.getpid(), name)
+        if key not in self._maps:
+            path = self.ensure(name)
+            with open(path, "rb") as f:
+                self._maps[key] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[key]
+
+
+_default_store = None
+
+
+def get_store() -> ModelStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = ModelStore()
+    return _default_store
@@ -0,0 +1,274 @@
+"""
+Load-shedding quality controller.
+
+Instead of letting every request run full-rate, full-resolution analysis while the
+queue grows, the controller maps current load to a quality tier and the planner
+degrades the AnalysisPlan accordingly:
+
+  full             plan unchanged
+  reduced_fps      sample at most QOS_REDUCED_FPS frames per second
+  capped_height    ... and downscale to at most QOS_REDUCED_HEIGHT
+  no_emotion       ... and skip the emotion model
+  transcript_only  skip visual analysis entirely
+
+Load is the worst of three ratios, each 1.0 at its target:
+  other analyses in flight in this worker / QOS_TARGET_IN_FLIGHT
+  queue wait (exponentially averaged, decaying while idle) / QOS_TARGET_QUEUE_WAIT
+  container CPU usage (cgroup cpu.stat) / usable cores
+
+The tier steps down as soon as load crosses a tier threshold and steps back up one
+tier per QOS_COOLDOWN seconds that load stays QOS_HYSTERESIS below that threshold,
+so it does not flap around a boundary. Recovery is evaluated on admit, release and
+status, and idle time counts towards it. With QOS_REJECT_IN_FLIGHT set, requests
+beyond that many in-flight analyses get a 429 instead.
+
+State is per process; with several gunicorn workers each one sheds on its own load.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import metrics
+import runtime_config
+from media_probe import AnalysisPlan, MediaInfo
+
+logger = logging.getLogger(__name__)
+
+TIERS = ["full", "reduced_fps", "capped_height", "no_emotion", "transcript_only"]
+# Fewest concurrent analyses counted as full load by default, so that with one
+# thread per worker a second request does not already degrade the first tiers
+MIN_TARGET_IN_FLIGHT = 2
+
+
+def parse_thresholds(value: str):
+    """
+    Parses QOS_THRESHOLDS: one load level per degraded tier, strictly increasing.
+    Raises:
+        ValueError: If the count is wrong or a value is not a positive, increasing number.
+    """
+    try:
+        thresholds = [float(part) for part in value.split(",")]
+    except ValueError:
+        raise ValueError(f"QOS_THRESHOLDS must be comma-separated numbers, got {value!r}") from None
+    if len(thresholds) != len(TIERS) - 1:
+        raise ValueError(f"QOS_THRESHOLDS needs {len(TIERS) - 1} values ({', '.join(TIERS[1:])}), got {value!r}")
+    if not all(math.isfinite(t) and t > 0 for t in thresholds):
+        raise ValueError(f"QOS_THRESHOLDS must be positive and finite, got {value!r}")
+    if any(b <= a for a, b in zip(thresholds, thresholds[1:])):
+        raise ValueError(f"QOS_THRESHOLDS must be strictly increasing, got {value!r}")
+    return thresholds
+
+
+# Load at which each degraded tier (TIERS[1:]) is entered
+TIER_THRESHOLDS = parse_thresholds(os.environ.get("QOS_THRESHOLDS", "0.7,0.9,1.1,1.4"))
+
+QOS_ENABLED = os.environ.get("QOS_ENABLED", "true").lower() in ("1", "true", "yes")
+# One worker's share of the cores, since each analysis already uses that many threads,
+# but never below MIN_TARGET_IN_FLIGHT (production can give a worker a single thread)
+QOS_TARGET_IN_FLIGHT = float(os.environ.get(
+    "QOS_TARGET_IN_FLIGHT",
+    max(MIN_TARGET_IN_FLIGHT, runtime_config.threads_per_worker(runtime_config.worker_count()))))
+QOS_TARGET_QUEUE_WAIT = float(os.environ.get("QOS_TARGET_QUEUE_WAIT", 0.5))
+QOS_QUEUE_WAIT_HALF_LIFE = float(os.environ.get("QOS_QUEUE_WAIT_HALF_LIFE", 10))
+QOS_HYSTERESIS = float(os.environ.get("QOS_HYSTERESIS", 0.15))
+QOS_COOLDOWN = float(os.environ.get("QOS_COOLDOWN", 10))
+QOS_REJECT_IN_FLIGHT = int(os.environ.get("QOS_REJECT_IN_FLIGHT", 0))
+QOS_REDUCED_FPS = float(os.environ.get("QOS_REDUCED_FPS", 5))
+QOS_REDUCED_HEIGHT = int(os.environ.get("QOS_REDUCED_HEIGHT", 360))
+
+# Weight of the newest sample in the queue wait average
+_QUEUE_WAIT_ALPHA = 0.2
+# Shortest window CPU usage is measured over; calls within it reuse the last value
+_CPU_SAMPLE_INTERVAL = 1.0
+_CORES = runtime_config.available_cores()
+
+
+class Overloaded(Exception):
+    """Raised by admit() when the request should be rejected with 429."""
+
+    def __init__(self, in_flight: int, retry_after: int):
+        super().__init__(f"{in_flight} analyses in flight")
+        self.in_flight = in_flight
+        self.retry_after = retry_after
+
+
+@dataclass
+class LoadSample:
+    in_flight: int
+    queue_wait: float
+    cpu_load: float
+
+    @property
+    def pressure(self) -> float:
+        return max(
+            self.in_flight / QOS_TARGET_IN_FLIGHT if QOS_TARGET_IN_FLIGHT > 0 else 0.0,
+            self.queue_wait / QOS_TARGET_QUEUE_WAIT if QOS_TARGET_QUEUE_WAIT > 0 else 0.0,
+            self.cpu_load,
+        )
+
+
+class _CpuMeter:
+    """
+    Container CPU utilisation from cgroup usage counters, as a fraction of the usable
+    cores. Falls back to the 1-minute load average where no cgroup counter is readable.
+    """
+
+    def __init__(self):
+        self._last = None
+        self._load = 0.0
+
+    def load(self, now: float) -> float:
+        usage = runtime_config.cgroup_cpu_seconds()
+        if usage is None:
+            try:
+                return os.getloadavg()[0] / _CORES
+            except (AttributeError, OSError):
+                return 0.0
+        if self._last is not None:
+            last_usage, last_now = self._last
+            if now - last_now < _CPU_SAMPLE_INTERVAL:
+                return self._load
+            self._load = (usage - last_usage) / (now - last_now) / _CORES
+        self._last = (usage, now)
+        return self._load
+
+
+class QualityController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queue_wait = 0.0
+        self._queue_wait_at = time.monotonic()
+        self._cpu = _CpuMeter()
+        self._tier = 0
+        self._recovering_since: Optional[float] = None
+        self._updated_at = time.monotonic()
+
+    def _decayed_queue_wait(self, now: float) -> float:
+        # Without new requests there is no queue; let the average fade instead of freezing
+        if QOS_QUEUE_WAIT_HALF_LIFE <= 0:
+            return self._queue_wait
+        return self._queue_wait * math.pow(0.5, (now - self._queue_wait_at) / QOS_QUEUE_WAIT_HALF_LIFE)
+
+    def observe_queue_wait(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            queue_wait = self._decayed_queue_wait(now)
+            self._queue_wait = queue_wait + _QUEUE_WAIT_ALPHA * (seconds - queue_wait)
+            self._queue_wait_at = now
+
+    def sample(self, now: float = None) -> LoadSample:
+        now = time.monotonic() if now is None else now
+        return LoadSample(self._in_flight, self._decayed_queue_wait(now), self._cpu.load(now))
+
+    def _update(self, pressure: float, now: float):
+        """Moves the tier towards the one `pressure` calls for, with hysteresis on the way up."""
+        target = sum(1 for threshold in TIER_THRESHOLDS if pressure >= threshold)
+        if target > self._tier:
+            logger.warning("Load %.2f: degrading analysis to %s", pressure, TIERS[target])
+            self._tier = target
+            self._recovering_since = None
+        elif target < self._tier and pressure < TIER_THRESHOLDS[self._tier - 1] - QOS_HYSTERESIS:
+            if self._recovering_since is None:
+                # An idle worker has had no load since it was last evaluated
+                self._recovering_since = self._updated_at if self._in_flight == 0 else now
+            # One tier per cooldown, including cooldowns that elapsed while idle
+            while (self._tier > target and pressure < TIER_THRESHOLDS[self._tier - 1] - QOS_HYSTERESIS
+                   and now - self._recovering_since >= QOS_COOLDOWN):
+                self._tier -= 1
+                self._recovering_since += QOS_COOLDOWN
+                logger.info("Load %.2f: restoring analysis to %s", pressure, TIERS[self._tier])
+            if self._tier == target:
+                self._recovering_since = None
+        else:
+            self._recovering_since = None
+        self._updated_at = now
+        metrics.QUALITY_TIER.set(self._tier)
+
+    def admit(self) -> str:
+        """
+        Counts a new analysis as in flight and returns the tier it should run at.
+        Raises:
+            Overloaded: When QOS_REJECT_IN_FLIGHT is set and already reached.
+        """
+        with self._lock:
+            if QOS_REJECT_IN_FLIGHT and self._in_flight >= QOS_REJECT_IN_FLIGHT:
+                metrics.QUALITY_TIER_REQUESTS.labels(tier="rejected").inc()
+                raise Overloaded(self._in_flight, retry_after=max(1, int(QOS_COOLDOWN)))
+            if QOS_ENABLED:
+                # Pressure from the analyses this one would share the worker with
+                now = time.monotonic()
+                self._update(self.sample(now).pressure, now)
+            self._in_flight += 1
+            tier = TIERS[self._tier]
+        metrics.QUALITY_TIER_REQUESTS.labels(tier=tier).inc()
+        return tier
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if QOS_ENABLED:
+                # Start the recovery clock as soon as load drops, not at the next admit
+                now = time.monotonic()
+                self._update(self.sample(now).pressure, now)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            sample = self.sample(now)
+            if QOS_ENABLED:
+                self._update(sample.pressure, now)
+            return {
+                "enabled": QOS_ENABLED,
+                "tier": TIERS[self._tier],
+                "in_flight": sample.in_flight,
+                "queue_wait": round(sample.queue_wait, 3),
+                "cpu_load": round(sample.cpu_load, 2),
+                "pressure": round(sample.pressure, 2),
+            }
+
+
+controller = QualityController()
+
+
+def apply_tier(plan: AnalysisPlan, info: MediaInfo, tier: str) -> AnalysisPlan:
+    """
+    Degrades a plan in place to the given quality tier.
+    Args:
+        plan: The AnalysisPlan from media_probe.plan_analysis.
+        info: The MediaInfo the plan was made from.
+        tier: One of TIERS.
+    Returns:
+        The same plan, for chaining.
+    """
+    plan.quality_tier = tier
+    level = TIERS.index(tier)
+    if level == 0 or not plan.analyze_visual:
+        return plan
+
+    if level >= TIERS.index("transcript_only"):
+        plan.analyze_visual = False
+        plan.reasons.append("under load: transcript only")
+        return plan
+
+    if info.fps > QOS_REDUCED_FPS > 0:
+        stride = max(1, int(round(info.fps / QOS_REDUCED_FPS)))
+        if stride > plan.frame_stride:
+            plan.frame_stride = stride
+            plan.reasons.append(f"under load: sampling every {stride} frames")
+
+    if level >= TIERS.index("capped_height") and info.height > QOS_REDUCED_HEIGHT:
+        if not plan.max_height or plan.max_height > QOS_REDUCED_HEIGHT:
+            plan.max_height = QOS_REDUCED_HEIGHT
+            plan.reasons.append(f"under load: downscaling to {QOS_REDUCED_HEIGHT}p")
+
+    if level >= TIERS.index("no_emotion"):
+        plan.analyze_emotion = False
+        plan.reasons.append("under load: skipping emotion analysis")
+
+    return plan
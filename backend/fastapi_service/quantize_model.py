@@ -0,0 +1,51 @@
+"""
+Produces a dynamically quantized int8 variant of the FER+ emotion model.
+
+Usage:
+  pip install onnx onnxruntime
+  python quantize_model.py [--input models/emotion-ferplus-8.onnx] [--output models/emotion-ferplus-8.int8.onnx]
+
+Select it at runtime with EMOTION_BACKEND=onnxruntime EMOTION_MODEL_VARIANT=int8.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import emotion_backend
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+def quantize(input_path, output_path):
+    """
+    Quantizes weights to int8; activations are quantized on the fly at inference time.
+    Args:
+        input_path: The fp32 ONNX model.
+        output_path: Where to write the int8 model.
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Model not found: {input_path}")
+
+    # Write next to the destination and rename, so a crash never leaves a truncated model
+    tmp_path = output_path + ".tmp"
+    quantize_dynamic(input_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, output_path)
+
+    before = os.path.getsize(input_path)
+    after = os.path.getsize(output_path)
+    logger.info(f"Quantized {input_path} ({before} bytes) -> {output_path} ({after} bytes, {after / before:.0%})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", default=emotion_backend.model_path("fp32"))
+    parser.add_argument("--output", default=emotion_backend.model_path("int8"))
+    args = parser.parse_args()
+    quantize(args.input, args.output)
@@ -0,0 +1,121 @@
+"""
+Process-level runtime settings: core detection, worker count and per-worker thread budgets.
+
+The thread limits must be applied before numpy, OpenCV or MediaPipe are imported,
+because BLAS/OpenMP read their environment variables only once at load time.
+"""
+
+import os
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Environment variables read by the native thread pools we pull in
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+]
+
+
+def available_cores() -> int:
+    """
+    Returns the number of cores this process may actually use, honouring CPU
+    affinity and a cgroup v2 CPU quota when running in a container.
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, cores)
+
+
+def cgroup_cpu_seconds():
+    """
+    Returns the CPU time in seconds used so far by this container's cgroup (v2
+    cpu.stat, or v1 cpuacct), or None when neither is readable.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.stat") as f:
+            for line in f:
+                if line.startswith("usage_usec "):
+                    return int(line.split()[1]) / 1e6
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpuacct/cpuacct.usage") as f:
+            return int(f.read()) / 1e9
+    except (OSError, ValueError):
+        return None
+
+
+def worker_count() -> int:
+    """
+    Number of server worker processes. `WEB_CONCURRENCY` wins if set; otherwise
+    production mode uses one worker per core and development mode uses one.
+    """
+    configured = os.environ.get("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    if os.environ.get("SERVER_MODE", "development") == "production":
+        return available_cores()
+    return 1
+
+
+def threads_per_worker(workers: int) -> int:
+    """Splits the available cores evenly between worker processes."""
+    configured = os.environ.get("THREADS_PER_WORKER")
+    if configured:
+        return max(1, int(configured))
+    return max(1, available_cores() // max(1, workers))
+
+
+def apply_thread_limits(threads: int):
+    """
+    Caps the BLAS/OpenMP/OpenCV thread pools of this process to `threads`.
+    Values already present in the environment are left untouched.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(threads))
+    # Chunk parallelism inside analyze_video shares the same budget
+    os.environ.setdefault("MAX_ANALYSIS_WORKERS", str(threads))
+    set_opencv_threads(threads)
+
+
+def current_thread_budget() -> int:
+    """Thread budget chosen by apply_thread_limits for this process."""
+    return max(1, int(os.environ.get("OMP_NUM_THREADS") or available_cores()))
+
+
+def set_opencv_threads(threads: int):
+    # Only touch OpenCV once something has imported it; importing it here would
+    # defeat lazy loading of the analysis stack
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        cv2.setNumThreads(threads)
+
+
+def preload_models():
+    """
+    Imports the analysis stack and reads the emotion model into memory so that
+    forked workers share those pages copy-on-write instead of each loading them.
+    """
+    try:
+        import analysis
+        set_opencv_threads(current_thread_budget())
+        analysis.preload()
+        logger.info("Preloaded analysis module and emotion model")
+    except Exception as e:
+        logger.warning(f"Could not preload analysis models: {e}")
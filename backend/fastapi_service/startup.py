@@ -0,0 +1,160 @@
+"""
+Startup phase: one-time capability detection and model warm-up.
+
+Capabilities are detected once and cached so health probes never spawn processes.
+Warm-up imports the heavy analysis stack, runs FaceMesh and the emotion model on a
+dummy frame and reads a dummy audio clip, then flips the service to ready.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+import logging
+from typing import Dict, Any
+
+import runtime_config
+
+logger = logging.getLogger(__name__)
+
+_capabilities: Dict[str, bool] = {}
+_capabilities_lock = threading.Lock()
+
+_state: Dict[str, Any] = {
+    "ready": False,
+    "warming": False,
+    "started_at": time.time(),
+    "import_seconds": None,
+    "warmup_seconds": None,
+    "error": None,
+}
+_warm_up_thread = None
+
+
+def _binary_works(name: str) -> bool:
+    if not shutil.which(name):
+        return False
+    try:
+        subprocess.run([name, '-version'], capture_output=True, check=True, timeout=10)
+        return True
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+        return False
+
+
+def _module_available(name: str) -> bool:
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def detect_capabilities(refresh: bool = False) -> Dict[str, bool]:
+    """
+    Detects external tools and optional libraries once and caches the result.
+    The `analysis` entry is filled in by warm_up, since importing it is expensive.
+    """
+    with _capabilities_lock:
+        if _capabilities and not refresh:
+            return dict(_capabilities)
+        _capabilities.update({
+            "ffmpeg": _binary_works("ffmpeg"),
+            "ffprobe": _binary_works("ffprobe"),
+            "speech_recognition": _module_available("speech_recognition"),
+            "pydub": _module_available("pydub"),
+        })
+        _capabilities.setdefault("analysis", False)
+        return dict(_capabilities)
+
+
+def _write_silence(path: str, seconds: float = 0.5, rate: int = 16000):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b'\x00\x00' * int(rate * seconds))
+
+
+def _warm_audio():
+    """Exercises the speech_recognition WAV reader and energy calibration offline."""
+    import speech_recognition as sr
+
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        _write_silence(path)
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(path) as source:
+            recognizer.adjust_for_ambient_noise(source, duration=0.25)
+            recognizer.record(source)
+    finally:
+        os.unlink(path)
+
+
+def warm_up():
+    """
+    Runs the warm-up phase synchronously. Safe to call more than once.
+    """
+    _state["warming"] = True
+    capabilities = detect_capabilities()
+    warm_start = time.perf_counter()
+    try:
+        import_start = time.perf_counter()
+        try:
+            import analysis
+            _state["import_seconds"] = round(time.perf_counter() - import_start, 3)
+            logger.info(f"Imported analysis stack in {_state['import_seconds']:.3f}s")
+            runtime_config.set_opencv_threads(runtime_config.current_thread_budget())
+            analysis.warm_up()
+            capabilities["analysis"] = True
+        except Exception as e:
+            logger.warning(f"Analysis warm-up failed, visual analysis disabled: {e}")
+            _state["error"] = str(e)
+
+        if capabilities["speech_recognition"]:
+            try:
+                _warm_audio()
+            except Exception as e:
+                logger.warning(f"Audio warm-up failed: {e}")
+
+        with _capabilities_lock:
+            _capabilities.update(capabilities)
+    finally:
+        _state["warmup_seconds"] = round(time.perf_counter() - warm_start, 3)
+        _state["warming"] = False
+        _state["ready"] = True
+        logger.info(f"Warm-up finished in {_state['warmup_seconds']:.3f}s; service is ready")
+
+
+def start_warm_up():
+    """Starts warm_up on a background thread so liveness is reported immediately."""
+    global _warm_up_thread
+    if _warm_up_thread is not None:
+        return
+    _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    _warm_up_thread.start()
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def analysis_available() -> bool:
+    """False once warm-up has finished without loading the analysis stack."""
+    return not _state["ready"] or detect_capabilities()["analysis"]
+
+
+def status() -> Dict[str, Any]:
+    """Snapshot of the startup state for the readiness endpoint."""
+    return {
+        "ready": _state["ready"],
+        "warming": _state["warming"],
+        "uptime_seconds": round(time.time() - _state["started_at"], 3),
+        "import_seconds": _state["import_seconds"],
+        "warmup_seconds": _state["warmup_seconds"],
+        "error": _state["error"],
+        "capabilities": detect_capabilities(),
+    }
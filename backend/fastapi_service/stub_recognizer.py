@@ -0,0 +1,33 @@
+"""
+Deterministic offline stand-in for the Google recognizer, for benchmarks and load tests.
+
+The returned text depends only on the audio length, and an optional fixed delay
+(STUB_RECOGNIZER_LATENCY, seconds) simulates the network round trip.
+"""
+
+import os
+import time
+
+import speech_recognition as sr
+
+WORDS = ["tell", "me", "about", "a", "project", "you", "are", "proud", "of", "and", "why"]
+
+
+class StubRecognizer(sr.Recognizer):
+    def __init__(self, latency: float = None):
+        super().__init__()
+        self.latency = float(os.environ.get("STUB_RECOGNIZER_LATENCY", 0)) if latency is None else latency
+
+    def _transcript(self, audio_data) -> str:
+        seconds = len(audio_data.frame_data) / float(audio_data.sample_rate * audio_data.sample_width)
+        # Roughly 2.5 words per second of speech
+        count = max(1, int(seconds * 2.5))
+        return " ".join(WORDS[i % len(WORDS)] for i in range(count))
+
+    def recognize_google(self, audio_data, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._transcript(audio_data)
+
+    def recognize_sphinx(self, audio_data, *args, **kwargs):
+        return self._transcript(audio_data)
@@ -0,0 +1,82 @@
+"""
+media_probe against canned ffprobe output.
+
+Run from backend/fastapi_service:
+  python -m pytest tests
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media_probe  # noqa: E402
+
+# What ffprobe reports for a Chrome MediaRecorder upload: no duration, no frame
+# count, avg_frame_rate 0/0 and the 1 kHz Matroska timebase as r_frame_rate
+MEDIARECORDER_WEBM = {
+    "format": {"format_name": "matroska,webm"},
+    "streams": [
+        {"codec_type": "video", "codec_name": "vp8", "width": 1280, "height": 720,
+         "avg_frame_rate": "0/0", "r_frame_rate": "1000/1"},
+        {"codec_type": "audio", "codec_name": "opus"},
+    ],
+}
+
+
+def _fake_ffprobe(streams_json, packet_times):
+    def run(cmd, **kwargs):
+        if "-show_entries" in cmd:
+            stdout = "".join(f"{t}\n" for t in packet_times)
+        else:
+            stdout = json.dumps(streams_json)
+        return subprocess.CompletedProcess(cmd, 0, stdout=stdout, stderr="")
+    return run
+
+
+def test_mediarecorder_webm_rate_comes_from_packets(monkeypatch):
+    # 12s at 30 fps
+    times = [round(i / 30, 3) for i in range(360)]
+    monkeypatch.setattr(media_probe.subprocess, "run", _fake_ffprobe(MEDIARECORDER_WEBM, times))
+
+    info = media_probe._probe_with_ffprobe("upload.webm")
+
+    assert abs(info.fps - 30) < 0.1
+    assert info.frame_count == 360
+    assert abs(info.duration - 12) < 0.05
+    plan = media_probe.plan_analysis(info)
+    assert plan.frame_stride == 3
+    assert not plan.seekable
+
+
+def test_timebase_rate_is_not_trusted_without_packets(monkeypatch):
+    monkeypatch.setattr(media_probe.subprocess, "run", _fake_ffprobe(MEDIARECORDER_WEBM, []))
+    monkeypatch.setattr(media_probe, "_opencv_fps", lambda path: 0.0)
+
+    info = media_probe._probe_with_ffprobe("upload.webm")
+
+    assert info.fps == 0.0
+    assert media_probe.plan_analysis(info).frame_stride == 1
+
+
+def test_header_rate_is_used_when_plausible(monkeypatch):
+    mp4 = {
+        "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "10.0"},
+        "streams": [{"codec_type": "video", "codec_name": "h264", "width": 640, "height": 360,
+                     "avg_frame_rate": "30000/1001", "r_frame_rate": "30000/1001", "nb_frames": "300"}],
+    }
+    calls = []
+
+    def run(cmd, **kwargs):
+        calls.append(cmd)
+        return _fake_ffprobe(mp4, [])(cmd, **kwargs)
+
+    monkeypatch.setattr(media_probe.subprocess, "run", run)
+
+    info = media_probe._probe_with_ffprobe("upload.mp4")
+
+    assert abs(info.fps - 29.97) < 0.01
+    assert info.frame_count == 300
+    assert len(calls) == 1
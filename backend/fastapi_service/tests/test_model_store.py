@@ -0,0 +1,164 @@
+"""
+ModelStore against a local HTTP server that supports Range, If-Range and ETags.
+
+Run from backend/fastapi_service:
+  python -m pytest tests
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_store import ModelSpec, ModelStore, ModelStoreError  # noqa: E402
+
+NAME = "model.onnx"
+DATA = os.urandom(300 * 1024)
+
+
+class _ModelHandler(BaseHTTPRequestHandler):
+    data = DATA
+    etag = '"v1"'
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append(dict(self.headers))
+        body, status = self.data, 200
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == self.etag):
+            start = int(range_header.split("=")[1].rstrip("-"))
+            if start >= len(self.data):
+                self.send_response(416)
+                self.end_headers()
+                return
+            body, status = self.data[start:], 206
+        self.send_response(status)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(self.data) - 1}/{len(self.data)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _ModelHandler.data, _ModelHandler.etag, _ModelHandler.requests_seen = DATA, '"v1"', []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _ModelHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/{NAME}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _store(tmp_path, url, sha256=None, size=None):
+    spec = ModelSpec(name=NAME, url=url, sha256=sha256, size=size)
+    return ModelStore(cache_dir=str(tmp_path), manifest={NAME: spec}, buffer_size=64 * 1024)
+
+
+def test_download_verifies_and_maps(server, tmp_path):
+    store = _store(tmp_path, server, hashlib.sha256(DATA).hexdigest(), len(DATA))
+
+    assert store.open(NAME)[:] == DATA
+    assert not os.path.exists(store.path(NAME) + ".part")
+    # A verified copy is not fetched again
+    store.ensure(NAME)
+    assert len(_ModelHandler.requests_seen) == 1
+
+
+def test_resume_sends_range_with_validator(server, tmp_path):
+    store = _store(tmp_path, server, hashlib.sha256(DATA).hexdigest(), len(DATA))
+    part_path = store.path(NAME) + ".part"
+    with open(part_path, "wb") as f:
+        f.write(DATA[:100 * 1024])
+    with open(part_path + ".validator", "w") as f:
+        f.write('"v1"')
+
+    with open(store.ensure(NAME), "rb") as f:
+        assert f.read() == DATA
+    headers = _ModelHandler.requests_seen[0]
+    assert headers["Range"] == f"bytes={100 * 1024}-"
+    assert headers["If-Range"] == '"v1"'
+
+
+def test_changed_upstream_restarts_download(server, tmp_path):
+    _ModelHandler.data, _ModelHandler.etag = DATA[::-1], '"v2"'
+    store = _store(tmp_path, server, hashlib.sha256(DATA[::-1]).hexdigest(), len(DATA))
+    part_path = store.path(NAME) + ".part"
+    with open(part_path, "wb") as f:
+        f.write(DATA[:100 * 1024])
+    with open(part_path + ".validator", "w") as f:
+        f.write('"v1"')
+
+    with open(store.ensure(NAME), "rb") as f:
+        assert f.read() == DATA[::-1]
+
+
+def test_part_without_validator_is_not_spliced(server, tmp_path):
+    store = _store(tmp_path, server, hashlib.sha256(DATA).hexdigest(), len(DATA))
+    with open(store.path(NAME) + ".part", "wb") as f:
+        f.write(b"x" * 1024)
+
+    with open(store.ensure(NAME), "rb") as f:
+        assert f.read() == DATA
+    assert "Range" not in _ModelHandler.requests_seen[0]
+
+
+def test_checksum_mismatch_leaves_nothing_behind(server, tmp_path):
+    store = _store(tmp_path, server, "0" * 64, len(DATA))
+
+    with pytest.raises(ModelStoreError):
+        store.ensure(NAME)
+    assert not os.path.exists(store.path(NAME))
+    assert not os.path.exists(store.path(NAME) + ".part")
+
+
+def test_corrupt_cached_copy_is_replaced(server, tmp_path):
+    store = _store(tmp_path, server, hashlib.sha256(DATA).hexdigest(), len(DATA))
+    with open(store.path(NAME), "wb") as f:
+        f.write(b"\0" * len(DATA))
+
+    assert store.open(NAME)[:] == DATA
+
+
+def test_open_unlisted_model_goes_through_ensure(tmp_path):
+    store = ModelStore(cache_dir=str(tmp_path), manifest={})
+
+    with pytest.raises(ModelStoreError):
+        store.open("model.int8.onnx")
+
+    with open(store.path("model.int8.onnx"), "wb") as f:
+        f.write(DATA)
+    assert store.open("model.int8.onnx")[:] == DATA
+    assert os.path.exists(store.path("model.int8.onnx") + ".sha256")
+
+
+def test_unpinned_download_is_refused_when_pins_are_required(server, tmp_path):
+    spec = ModelSpec(name=NAME, url=server)
+    store = ModelStore(cache_dir=str(tmp_path), manifest={NAME: spec}, require_pinned=True)
+
+    with pytest.raises(ModelStoreError):
+        store.ensure(NAME)
+    assert not _ModelHandler.requests_seen
+    assert not os.path.exists(store.path(NAME))
+
+
+def test_unpinned_warning_is_logged_once(server, tmp_path, caplog):
+    store = ModelStore(cache_dir=str(tmp_path), manifest={NAME: ModelSpec(name=NAME, url=server)},
+                       require_pinned=False)
+
+    store.ensure(NAME)
+    assert store.verify(NAME) and store.verify(NAME, force=True)
+    assert sum("no pinned checksum" in record.message for record in caplog.records) == 1
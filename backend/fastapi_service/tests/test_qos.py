@@ -0,0 +1,28 @@
+"""
+QOS_THRESHOLDS parsing.
+
+Run from backend/fastapi_service:
+  python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qos  # noqa: E402
+
+
+def test_default_thresholds_parse():
+    assert qos.parse_thresholds("0.7,0.9,1.1,1.4") == [0.7, 0.9, 1.1, 1.4]
+
+
+@pytest.mark.parametrize("value", ["0.9,0.7,1.1,1.4", "0.7,0.7,1.1,1.4", "0.7,0.9,1.1", "0.7,x,1.1,1.4",
+                                   "0,0.9,1.1,1.4", "0.7,0.9,1.1,nan"])
+def test_invalid_thresholds_are_rejected(value):
+    with pytest.raises(ValueError):
+        qos.parse_thresholds(value)
@@ -0,0 +1,376 @@
+"""
+aptitude_sampler.py
+In-memory stratified sampler for generating aptitude test papers.
+
+The question bank is indexed once into buckets of integer slots keyed by
+(company tag, category, topic, difficulty), with None as the "any" value for company,
+topic and difficulty. A paper is drawn by splitting its size across categories and
+difficulties and picking random slots from the matching buckets, so generating a
+paper costs O(k) for k questions instead of one Mongo query per stratum.
+Questions can be added, changed or removed in O(tags) through swap-remove. A
+question tagged with several requested companies sits in several buckets; it is
+only accepted from the bucket of the first of those companies, so every matching
+question is equally likely.
+
+Usage:
+  python execution/aptitude_sampler.py --bench [--questions 50000] [--papers 20000] [--size 30]
+
+  from aptitude_sampler import QuestionIndex, PaperSpec
+  index = QuestionIndex.from_questions(collection.find({}, QuestionIndex.PROJECTION))
+  paper = index.generate_paper(PaperSpec(size=20, category_mix={"quantitative": 0.5, "logical": 0.5},
+                                         companies=["TCS"], time_budget=1200, exclude=seen_ids))
+"""
+
+import argparse
+import random
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CATEGORIES = ("quantitative", "logical", "verbal")
+DIFFICULTIES = ("easy", "medium", "hard")
+DEFAULT_TIME_SECONDS = 60
+
+BucketKey = Tuple[Optional[str], str, Optional[str], Optional[str]]
+
+
+class _Bucket:
+    """Unordered set of slots with O(1) add, remove and random access."""
+    __slots__ = ("items", "pos")
+
+    def __init__(self):
+        self.items: List[int] = []
+        self.pos: Dict[int, int] = {}
+
+    def add(self, slot: int):
+        self.pos[slot] = len(self.items)
+        self.items.append(slot)
+
+    def remove(self, slot: int):
+        index = self.pos.pop(slot)
+        last = self.items.pop()
+        if last != slot:
+            self.items[index] = last
+            self.pos[last] = index
+
+
+@dataclass
+class PaperSpec:
+    """
+    Constraints for one paper.
+    Args:
+        size: Number of questions.
+        category_mix: Weight per category; None spreads evenly over the indexed categories.
+        difficulty_mix: Weight per difficulty; None leaves difficulty unconstrained.
+        companies: Only questions tagged with one of these companies.
+        topics: Only questions on one of these topics.
+        time_budget: Upper bound on the summed averageTimeSeconds.
+        exclude: Question ids that must not appear (e.g. previously attempted).
+    """
+    size: int
+    category_mix: Optional[Dict[str, float]] = None
+    difficulty_mix: Optional[Dict[str, float]] = None
+    companies: Optional[Sequence[str]] = None
+    topics: Optional[Sequence[str]] = None
+    time_budget: Optional[int] = None
+    exclude: Collection[Any] = field(default_factory=frozenset)
+
+
+@dataclass
+class Paper:
+    question_ids: List[Any]
+    total_time: int
+    shortfall: int = 0
+
+
+def _allocate(total: int, weights: Dict[Any, float]) -> Dict[Any, int]:
+    """Splits `total` in proportion to `weights` using largest remainders."""
+    positive = {key: weight for key, weight in weights.items() if weight > 0}
+    weight_sum = sum(positive.values())
+    if not positive or total <= 0:
+        return {}
+    shares = {key: total * weight / weight_sum for key, weight in positive.items()}
+    counts = {key: int(share) for key, share in shares.items()}
+    by_remainder = sorted(positive, key=lambda key: shares[key] - counts[key], reverse=True)
+    for key in by_remainder[:total - sum(counts.values())]:
+        counts[key] += 1
+    return counts
+
+
+class QuestionIndex:
+    """Bucketed index over a question bank; see the module docstring."""
+
+    PROJECTION = {"_id": 1, "category": 1, "difficulty": 1, "topic": 1, "companyTags": 1, "averageTimeSeconds": 1}
+
+    def __init__(self):
+        self._ids: List[Any] = []
+        self._times = array("I")
+        self._keys: List[Optional[Tuple[BucketKey, ...]]] = []
+        self._tags: List[Optional[Tuple[str, ...]]] = []
+        self._slots: Dict[Any, int] = {}
+        self._free: List[int] = []
+        self._buckets: Dict[BucketKey, _Bucket] = {}
+        self._min_time: Optional[int] = None
+
+    @classmethod
+    def from_questions(cls, questions: Iterable[Dict[str, Any]]) -> "QuestionIndex":
+        index = cls()
+        for question in questions:
+            index.add(question)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, question_id) -> bool:
+        return question_id in self._slots
+
+    @staticmethod
+    def _question_id(question: Dict[str, Any]):
+        for key in ("_id", "seedKey", "key"):
+            if question.get(key) is not None:
+                return question[key]
+        raise ValueError("question has no _id, seedKey or key")
+
+    def add(self, question: Dict[str, Any]):
+        """Indexes a question, replacing any earlier version with the same id."""
+        question_id = self._question_id(question)
+        if question_id in self._slots:
+            self.remove(question_id)
+
+        category = question["category"]
+        difficulty = question.get("difficulty", "medium")
+        seconds = int(question.get("averageTimeSeconds") or DEFAULT_TIME_SECONDS)
+        tags = tuple(dict.fromkeys(question.get("companyTags") or ()))
+        # Without a topic or difficulty the wildcard and specific keys coincide; each
+        # bucket must hold the slot once or it is drawn twice as often and remove fails
+        keys = tuple(dict.fromkeys(
+            (company, category, topic, level)
+            for company in (None, *tags)
+            for topic in (None, question.get("topic"))
+            for level in (None, difficulty)
+        ))
+
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot], self._times[slot], self._keys[slot], self._tags[slot] = question_id, seconds, keys, tags
+        else:
+            slot = len(self._ids)
+            self._ids.append(question_id)
+            self._times.append(seconds)
+            self._keys.append(keys)
+            self._tags.append(tags)
+        self._slots[question_id] = slot
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket()
+            bucket.add(slot)
+        if self._min_time is not None and seconds < self._min_time:
+            self._min_time = seconds
+
+    def remove(self, question_id) -> bool:
+        """Drops a question from the index; returns False if it was not indexed."""
+        slot = self._slots.pop(question_id, None)
+        if slot is None:
+            return False
+        for key in self._keys[slot]:
+            bucket = self._buckets[key]
+            bucket.remove(slot)
+            if not bucket.items:
+                del self._buckets[key]
+        if self._times[slot] == self._min_time:
+            self._min_time = None  # recomputed on next use
+        self._ids[slot], self._keys[slot], self._tags[slot] = None, None, None
+        self._free.append(slot)
+        return True
+
+    def count(self, category: str, difficulty: Optional[str] = None, company: Optional[str] = None,
+              topic: Optional[str] = None) -> int:
+        bucket = self._buckets.get((company, category, topic, difficulty))
+        return len(bucket.items) if bucket else 0
+
+    def _minimum_time(self) -> int:
+        if self._min_time is None:
+            self._min_time = min((self._times[slot] for slot in self._slots.values()), default=0)
+        return self._min_time
+
+    def generate_paper(self, spec: PaperSpec, rng: Optional[random.Random] = None) -> Paper:
+        """
+        Draws a stratified paper in O(k) expected time.
+        Strata that cannot be filled (too few matching questions, exclusions or the
+        time budget) are topped up from other difficulties of the same category, then
+        from other requested categories; whatever is still missing is reported as
+        `shortfall`.
+        Args:
+            spec: The paper constraints.
+            rng: Random source, e.g. random.Random(seed) for reproducible papers.
+        Returns:
+            A Paper with the question ids in random order.
+        """
+        rng = rng or random
+        categories = spec.category_mix or {
+            category: 1.0 for category in CATEGORIES if (None, category, None, None) in self._buckets
+        }
+        companies = list(dict.fromkeys(spec.companies)) if spec.companies else [None]
+        topics = list(dict.fromkeys(spec.topics)) if spec.topics else [None]
+        exclude = spec.exclude
+
+        budget = spec.time_budget
+        reserve_per_slot = self._minimum_time() if budget is not None else 0
+        chosen: Dict[int, None] = {}
+        state = {"remaining_budget": budget, "remaining_slots": spec.size}
+
+        def fits(slot: int) -> bool:
+            if budget is None:
+                return True
+            reserve = (state["remaining_slots"] - 1) * reserve_per_slot
+            return self._times[slot] <= state["remaining_budget"] - reserve
+
+        def take(slot: int):
+            chosen[slot] = None
+            state["remaining_slots"] -= 1
+            if budget is not None:
+                state["remaining_budget"] -= self._times[slot]
+
+        def owner(slot: int) -> Optional[str]:
+            """The requested company whose bucket a slot counts in: the first one it is tagged with."""
+            tags = self._tags[slot]
+            return next(company for company in companies if company in tags)
+
+        def draw(category: str, difficulty: Optional[str], wanted: int) -> int:
+            strata = [(company, self._buckets[key]) for company, key in (
+                (company, (company, category, topic, difficulty)) for company in companies for topic in topics
+            ) if key in self._buckets]
+            total = sum(len(bucket.items) for _, bucket in strata)
+            multi_company = len(companies) > 1
+            taken = 0
+            # Rejection sampling stays O(wanted) while exclusions are a minority of the bucket
+            attempts = 8 * wanted + 32
+            while taken < wanted and attempts and total:
+                attempts -= 1
+                offset = rng.randrange(total)
+                for company, bucket in strata:
+                    if offset < len(bucket.items):
+                        slot = bucket.items[offset]
+                        break
+                    offset -= len(bucket.items)
+                if multi_company and owner(slot) != company:
+                    continue
+                if slot in chosen or self._ids[slot] in exclude or not fits(slot):
+                    continue
+                take(slot)
+                taken += 1
+            if taken < wanted and total:
+                # Mostly excluded or over budget: scan the candidates in random order instead
+                candidates = list(dict.fromkeys(
+                    slot for _, bucket in strata for slot in bucket.items
+                    if slot not in chosen and self._ids[slot] not in exclude
+                ))
+                rng.shuffle(candidates)
+                for slot in candidates:
+                    if taken == wanted:
+                        break
+                    if slot not in chosen and fits(slot):
+                        take(slot)
+                        taken += 1
+            return wanted - taken
+
+        missing_by_category = {}
+        for category, category_count in _allocate(spec.size, categories).items():
+            if spec.difficulty_mix:
+                missing = sum(draw(category, difficulty, count)
+                              for difficulty, count in _allocate(category_count, spec.difficulty_mix).items())
+                if missing:
+                    missing = draw(category, None, missing)
+            else:
+                missing = draw(category, None, category_count)
+            missing_by_category[category] = missing
+
+        missing = sum(missing_by_category.values())
+        for category in categories:
+            if not missing:
+                break
+            missing = draw(category, None, missing)
+
+        question_ids = [self._ids[slot] for slot in chosen]
+        rng.shuffle(question_ids)
+        total_time = sum(self._times[slot] for slot in chosen)
+        # Counted from the result, so strata that were never drawn (no categories) count too
+        return Paper(question_ids=question_ids, total_time=total_time, shortfall=spec.size - len(question_ids))
+
+
+def _synthetic_bank(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    companies = ["TCS", "Infosys", "Wipro", "Cognizant", "Capgemini", "Accenture"]
+    topics = [f"topic-{i}" for i in range(12)]
+    return [{
+        "_id": f"q{i}",
+        "category": rng.choice(CATEGORIES),
+        "difficulty": rng.choice(DIFFICULTIES),
+        "topic": rng.choice(topics),
+        "companyTags": rng.sample(companies, rng.randint(0, 3)),
+        "averageTimeSeconds": rng.choice([15, 20, 30, 45, 60, 75, 90]),
+    } for i in range(count)]
+
+
+def benchmark(questions: int, papers: int, size: int, seed: int = 0):
+    bank = _synthetic_bank(questions, seed)
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    index = QuestionIndex.from_questions(bank)
+    build_seconds = time.perf_counter() - start
+    print(f"📦 Indexed {len(index)} questions in {build_seconds * 1000:.1f} ms")
+
+    exclude = {question["_id"] for question in rng.sample(bank, questions // 5)}
+    specs = {
+        "category mix": PaperSpec(size=size, category_mix={"quantitative": 0.5, "logical": 0.3, "verbal": 0.2}),
+        "mix + difficulty": PaperSpec(size=size, category_mix={"quantitative": 0.5, "logical": 0.3, "verbal": 0.2},
+                                      difficulty_mix={"easy": 0.3, "medium": 0.5, "hard": 0.2}),
+        "company + budget": PaperSpec(size=size, companies=["TCS", "Infosys"], time_budget=size * 45,
+                                      difficulty_mix={"easy": 0.3, "medium": 0.5, "hard": 0.2}),
+        "topics": PaperSpec(size=size, topics=["topic-0", "topic-1", "topic-2", "topic-3"],
+                            category_mix={"quantitative": 0.5, "logical": 0.5}),
+        "all + 20% excluded": PaperSpec(size=size, category_mix={"quantitative": 0.5, "logical": 0.3, "verbal": 0.2},
+                                        difficulty_mix={"easy": 0.3, "medium": 0.5, "hard": 0.2},
+                                        companies=["TCS"], time_budget=size * 45, exclude=exclude),
+    }
+    for name, spec in specs.items():
+        shortfall = 0
+        start = time.perf_counter()
+        for _ in range(papers):
+            shortfall += index.generate_paper(spec, rng).shortfall
+        seconds = time.perf_counter() - start
+        print(f"⚡ {name:<20} {papers / seconds:>10.0f} papers/s  ({seconds / papers * 1e6:.1f} µs/paper, "
+              f"shortfall {shortfall})")
+
+    updates = min(questions, 10000)
+    start = time.perf_counter()
+    for question in bank[:updates]:
+        changed = dict(question, difficulty=rng.choice(DIFFICULTIES))
+        index.add(changed)
+    for question in bank[:updates // 2]:
+        index.remove(question["_id"])
+    seconds = time.perf_counter() - start
+    print(f"🔁 {updates} updates + {updates // 2} removals in {seconds * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stratified aptitude paper sampler")
+    parser.add_argument("--bench", action="store_true", help="Run the benchmark on a synthetic bank")
+    parser.add_argument("--questions", type=int, default=50000, help="Synthetic bank size")
+    parser.add_argument("--papers", type=int, default=20000, help="Papers generated per scenario")
+    parser.add_argument("--size", type=int, default=30, help="Questions per paper")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.questions, args.papers, args.size, args.seed)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
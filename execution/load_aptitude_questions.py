@@ -0,0 +1,308 @@
+"""
+load_aptitude_questions.py
+Incrementally syncs the aptitudequestions collection with a question bank.
+
+Every question gets a stable key (its "key" field, or a hash of category, topic and
+question text) and a content hash. Only questions that are new or whose content
+changed are written, and only loader-managed questions that left the bank are
+deleted, so existing _ids, attempt statistics and the dynamic questions saved by
+the Node service are left alone. Writes go out as unordered bulk_write batches.
+Large banks can be streamed from JSONL files (one question object per line).
+
+Usage:
+  pip install pymongo python-dotenv
+  python execution/load_aptitude_questions.py                      # built-in bank
+  python execution/load_aptitude_questions.py bank1.jsonl bank2.jsonl --batch-size 1000
+  python execution/load_aptitude_questions.py bank.jsonl --dry-run --no-prune
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from pymongo import ASCENDING, DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+KEY_FIELD = "seedKey"
+HASH_FIELD = "contentHash"
+
+# Fields that define a question; statistics and timestamps are owned by the app
+CONTENT_FIELDS = (
+    "questionText", "options", "correctAnswer", "explanation", "shortcutMethod",
+    "topic", "category", "difficulty", "companyTags", "averageTimeSeconds",
+)
+REQUIRED_FIELDS = ("questionText", "options", "correctAnswer", "explanation", "topic", "category")
+CATEGORIES = ("quantitative", "logical", "verbal")
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# Compound indexes matching the filters used by the aptitude routes and services
+INDEXES = [
+    ([("category", ASCENDING), ("topic", ASCENDING), ("difficulty", ASCENDING)], "category_topic_difficulty"),
+    ([("category", ASCENDING), ("difficulty", ASCENDING)], "category_difficulty"),
+    ([("companyTags", ASCENDING), ("category", ASCENDING), ("difficulty", ASCENDING)], "companyTags_category_difficulty"),
+]
+
+DEFAULT_BATCH_SIZE = 500
+
+
+@dataclass
+class LoadStats:
+    inserted: int = 0
+    updated: int = 0
+    adopted: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    invalid: int = 0
+    duplicates: int = 0
+    batches: int = 0
+    write_errors: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def question_key(question: Dict[str, Any]) -> str:
+    """Stable identity of a question: its explicit "key", or a hash of where it lives and what it asks."""
+    if question.get("key"):
+        return str(question["key"])
+    identity = "\x1f".join([
+        question.get("category", ""),
+        question.get("topic", ""),
+        " ".join(str(question.get("questionText", "")).split()).lower(),
+    ])
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+def content_hash(question: Dict[str, Any]) -> str:
+    """SHA-256 of the question's content fields in canonical JSON form."""
+    content = {field: question.get(field) for field in CONTENT_FIELDS}
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def validate(question: Dict[str, Any]) -> Optional[str]:
+    """Returns why a question cannot be loaded, or None if it is valid."""
+    missing = [field for field in REQUIRED_FIELDS if question.get(field) in (None, "")]
+    if missing:
+        return f"missing {', '.join(missing)}"
+    if question["category"] not in CATEGORIES:
+        return f"unknown category {question['category']!r}"
+    if question.get("difficulty", "medium") not in DIFFICULTIES:
+        return f"unknown difficulty {question['difficulty']!r}"
+    options = question["options"]
+    if not isinstance(options, list) or not 2 <= len(options) <= 6:
+        return "options must be a list of 2-6 entries"
+    if not isinstance(question["correctAnswer"], int) or not 0 <= question["correctAnswer"] < len(options):
+        return "correctAnswer is not a valid option index"
+    return None
+
+
+def iter_jsonl(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Streams question objects from JSONL files without loading them into memory."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from e
+
+
+def ensure_indexes(collection):
+    """Creates the query indexes and the unique index on the loader key."""
+    for keys, name in INDEXES:
+        collection.create_index(keys, name=name)
+    collection.create_index([(KEY_FIELD, ASCENDING)], name=KEY_FIELD, unique=True, sparse=True)
+
+
+def _document(question: Dict[str, Any], key: str, digest: str, now: datetime) -> Dict[str, Any]:
+    document = {field: question[field] for field in CONTENT_FIELDS if field in question}
+    document.setdefault("difficulty", "medium")
+    document.setdefault("companyTags", [])
+    document.setdefault("averageTimeSeconds", 60)
+    document[KEY_FIELD] = key
+    document[HASH_FIELD] = digest
+    document["updatedAt"] = now
+    return document
+
+
+def _replace_content(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Update that makes the stored content exactly `document`, dropping fields the bank no longer has."""
+    update = {"$set": document}
+    removed = {field: "" for field in CONTENT_FIELDS if field not in document}
+    if removed:
+        update["$unset"] = removed
+    return update
+
+
+class _BatchWriter:
+    """Queues operations and counts each one under its LoadStats outcome once it is written."""
+
+    def __init__(self, collection, batch_size: int, stats: LoadStats, dry_run: bool):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.stats = stats
+        self.dry_run = dry_run
+        self.ops: List[Any] = []
+        self.outcomes: List[str] = []
+
+    def add(self, op, outcome: str):
+        self.ops.append(op)
+        self.outcomes.append(outcome)
+        if len(self.ops) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.ops:
+            return
+        failed = set()
+        if not self.dry_run:
+            # Unordered: one bad document does not stop the rest of the batch
+            try:
+                self.collection.bulk_write(self.ops, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                failed = {error["index"] for error in errors}
+                self.stats.write_errors += len(errors)
+                for error in errors[:5]:
+                    print(f"⚠️  Write failed: {error.get('errmsg')}")
+        for index, outcome in enumerate(self.outcomes):
+            if index not in failed:
+                setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+        self.stats.batches += 1
+        self.ops = []
+        self.outcomes = []
+
+
+def load_questions(collection, questions: Iterable[Dict[str, Any]], batch_size: int = DEFAULT_BATCH_SIZE,
+                   prune: bool = True, adopt_legacy: bool = True, dry_run: bool = False,
+                   create_indexes: bool = True) -> LoadStats:
+    """
+    Brings the collection in line with a question bank using the minimum of writes.
+    Args:
+        collection: A pymongo (or mongomock) collection.
+        questions: Question dicts, e.g. QUESTIONS or iter_jsonl(paths); consumed once.
+        batch_size: Operations per bulk_write call.
+        prune: Delete loader-managed questions that are no longer in the bank. Skipped
+            when any input question was invalid, since its stored copy would be deleted.
+        adopt_legacy: Attach keys to matching documents written by the old
+            delete-and-insert seeder instead of inserting duplicates.
+        dry_run: Count what would change without writing.
+        create_indexes: Ensure the query indexes exist.
+    Returns:
+        A LoadStats with the number of documents in each outcome. Writes the server
+        rejected are counted in write_errors instead.
+    """
+    stats = LoadStats()
+    if create_indexes and not dry_run:
+        ensure_indexes(collection)
+
+    existing = {
+        doc[KEY_FIELD]: doc.get(HASH_FIELD)
+        for doc in collection.find({KEY_FIELD: {"$exists": True}}, {KEY_FIELD: 1, HASH_FIELD: 1})
+    }
+    legacy = {}
+    if adopt_legacy:
+        # Documents without a key come from the old seeder or from the Node service;
+        # only ones whose content identity matches a bank question are ever touched
+        for doc in collection.find({KEY_FIELD: {"$exists": False}}, {"questionText": 1, "category": 1, "topic": 1}):
+            legacy.setdefault(question_key(doc), doc["_id"])
+
+    writer = _BatchWriter(collection, batch_size, stats, dry_run)
+    now = datetime.now(timezone.utc)
+    seen = set()
+
+    for question in questions:
+        problem = validate(question)
+        if problem:
+            stats.invalid += 1
+            print(f"⚠️  Skipping invalid question {question.get('questionText', '')[:60]!r}: {problem}")
+            continue
+        key = question_key(question)
+        if key in seen:
+            stats.duplicates += 1
+            continue
+        seen.add(key)
+
+        digest = content_hash(question)
+        if existing.get(key) == digest:
+            stats.unchanged += 1
+            continue
+
+        document = _document(question, key, digest, now)
+        if key in existing:
+            writer.add(UpdateOne({KEY_FIELD: key}, _replace_content(document)), "updated")
+        elif key in legacy:
+            writer.add(UpdateOne({"_id": legacy[key]}, _replace_content(document)), "adopted")
+        else:
+            writer.add(UpdateOne(
+                {KEY_FIELD: key},
+                {"$set": document, "$setOnInsert": {"timesAttempted": 0, "timesCorrect": 0, "createdAt": now}},
+                upsert=True,
+            ), "inserted")
+
+    if prune and stats.invalid:
+        print(f"⚠️  Not pruning: {stats.invalid} invalid questions in the input may still be live")
+    elif prune:
+        for key in existing.keys() - seen:
+            writer.add(DeleteOne({KEY_FIELD: key}), "deleted")
+
+    writer.flush()
+    return stats
+
+
+def get_collection():
+    """Connects using MONGODB_URI (from the environment or .env) and returns the collection."""
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    uri = os.getenv("MONGODB_URI")
+    if not uri:
+        raise ValueError("MONGODB_URI not set in .env")
+    client = MongoClient(uri)
+    return client, client.get_default_database()["aptitudequestions"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally load aptitude questions into MongoDB")
+    parser.add_argument("files", nargs="*", help="JSONL question files (default: the bank in seed_aptitude_questions.py)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Operations per bulk_write")
+    parser.add_argument("--no-prune", action="store_true", help="Keep managed questions missing from the input")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+    args = parser.parse_args()
+
+    if args.files:
+        questions = iter_jsonl(args.files)
+    else:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from seed_aptitude_questions import QUESTIONS
+        questions = QUESTIONS
+
+    client, collection = get_collection()
+    try:
+        stats = load_questions(collection, questions, batch_size=args.batch_size,
+                               prune=not args.no_prune, dry_run=args.dry_run)
+    finally:
+        client.close()
+
+    prefix = "🔎 Dry run:" if args.dry_run else "✅"
+    print(f"{prefix} {stats.inserted} inserted, {stats.updated} updated, {stats.adopted} adopted, "
+          f"{stats.unchanged} unchanged, {stats.deleted} deleted in {stats.batches} batches")
+    if stats.invalid or stats.duplicates:
+        print(f"⚠️  {stats.invalid} invalid and {stats.duplicates} duplicate questions skipped")
+    if stats.write_errors:
+        print(f"❌ {stats.write_errors} writes failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
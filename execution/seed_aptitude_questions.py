@@ -3,25 +3,18 @@ seed_aptitude_questions.py
 Seeds the MongoDB aptitude_questions collection with 100+ curated questions
 across Quantitative, Logical, and Verbal categories.
 
+Seeding is incremental (see load_aptitude_questions.py): only new or changed
+questions are written, so re-running it keeps existing _ids and statistics.
+
 Usage:
   pip install pymongo python-dotenv
   python execution/seed_aptitude_questions.py
 """
 
 import os
-import json
-from dotenv import load_dotenv
-from pymongo import MongoClient
-
-load_dotenv()
-
-MONGODB_URI = os.getenv("MONGODB_URI")
-if not MONGODB_URI:
-    raise ValueError("MONGODB_URI not set in .env")
+import sys
 
-client = MongoClient(MONGODB_URI)
-db = client.get_default_database()
-collection = db["aptitudequestions"]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # ─── Question Bank ───────────────────────────────────────────────
 QUESTIONS = [
@@ -107,20 +100,24 @@ QUESTIONS = [
     {"questionText": "Arrange in proper order: (A) He studied hard (B) He passed with distinction (C) He had an exam next week (D) He was very happy", "options": ["CABD", "ABCD", "CDAB", "ACBD"], "correctAnswer": 0, "explanation": "Logical order: Exam → Studied → Passed → Happy. C→A→B→D", "topic": "para-jumbles", "category": "verbal", "difficulty": "medium", "companyTags": ["Cognizant", "Capgemini"], "averageTimeSeconds": 60},
 ]
 
-def seed():
-    """Seed the database with questions."""
-    # Check existing count
-    existing = collection.count_documents({})
-    print(f"📊 Existing questions in DB: {existing}")
-
-    if existing >= len(QUESTIONS):
-        print("✅ Database already has enough questions. Skipping seed.")
-        return
-
-    # Clear and re-seed
-    collection.delete_many({})
-    result = collection.insert_many(QUESTIONS)
-    print(f"✅ Seeded {len(result.inserted_ids)} aptitude questions.")
+def seed(collection=None):
+    """Seed the database with questions. Pass a collection to skip connecting (e.g. mongomock)."""
+    from load_aptitude_questions import get_collection, load_questions
+
+    client = None
+    if collection is None:
+        client, collection = get_collection()
+    try:
+        print(f"📊 Existing questions in DB: {collection.count_documents({})}")
+        # Other tools may load extra banks into the same collection; only add and update here
+        stats = load_questions(collection, QUESTIONS, prune=False)
+    finally:
+        if client is not None:
+            client.close()
+    print(f"✅ Seeded aptitude questions: {stats.inserted} inserted, {stats.updated} updated, "
+          f"{stats.adopted} adopted, {stats.unchanged} unchanged.")
+    if stats.write_errors:
+        print(f"❌ {stats.write_errors} writes failed")
 
     # Print summary
     categories = {}
@@ -132,4 +129,3 @@ def seed():
 
 if __name__ == "__main__":
     seed()
-    client.close()
@@ -0,0 +1,98 @@
+"""
+Stratified paper sampler.
+
+Run from the repository root:
+  python -m pytest execution/tests
+"""
+
+import collections
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aptitude_sampler import PaperSpec, QuestionIndex, _synthetic_bank  # noqa: E402
+
+
+def test_paper_respects_mix_exclusions_and_budget():
+    bank = _synthetic_bank(2000)
+    index = QuestionIndex.from_questions(bank)
+    by_id = {question["_id"]: question for question in bank}
+    exclude = {question["_id"] for question in bank[:500]}
+    spec = PaperSpec(size=20, category_mix={"quantitative": 0.5, "verbal": 0.5}, companies=["TCS"],
+                     time_budget=20 * 60, exclude=exclude)
+
+    paper = index.generate_paper(spec, random.Random(0))
+
+    assert paper.shortfall == 0
+    assert len(set(paper.question_ids)) == 20
+    assert not exclude & set(paper.question_ids)
+    assert paper.total_time <= 20 * 60
+    assert all("TCS" in by_id[qid]["companyTags"] for qid in paper.question_ids)
+    categories = collections.Counter(by_id[qid]["category"] for qid in paper.question_ids)
+    assert categories == {"quantitative": 10, "verbal": 10}
+
+
+def test_topic_filter():
+    bank = _synthetic_bank(2000)
+    index = QuestionIndex.from_questions(bank)
+    by_id = {question["_id"]: question for question in bank}
+
+    paper = index.generate_paper(PaperSpec(size=15, topics=["topic-1", "topic-2"]), random.Random(0))
+
+    assert paper.shortfall == 0
+    assert {by_id[qid]["topic"] for qid in paper.question_ids} <= {"topic-1", "topic-2"}
+
+
+def test_shortfall_counts_questions_not_drawn():
+    assert QuestionIndex().generate_paper(PaperSpec(size=5)).shortfall == 5
+
+    index = QuestionIndex.from_questions([{"_id": "q1", "category": "logical"}])
+    assert index.generate_paper(PaperSpec(size=5, category_mix={"logical": 0.0})).shortfall == 5
+    assert index.generate_paper(PaperSpec(size=5)).shortfall == 4
+
+
+def test_questions_with_several_requested_companies_are_not_favoured():
+    index = QuestionIndex.from_questions([
+        {"_id": "both", "category": "logical", "companyTags": ["TCS", "Infosys"]},
+        {"_id": "tcs", "category": "logical", "companyTags": ["TCS"]},
+        {"_id": "infosys", "category": "logical", "companyTags": ["Infosys"]},
+    ])
+    rng = random.Random(0)
+    spec = PaperSpec(size=1, companies=["TCS", "Infosys"])
+
+    counts = collections.Counter(qid for _ in range(6000) for qid in index.generate_paper(spec, rng).question_ids)
+
+    assert all(1700 < count < 2300 for count in counts.values()), counts
+
+
+def test_questions_without_topic_or_difficulty_index_once():
+    index = QuestionIndex()
+    index.add({"_id": "a", "category": "logical", "averageTimeSeconds": 10})
+    index.add({"_id": "b", "category": "logical", "topic": "series", "difficulty": None})
+
+    assert index.count("logical") == 2
+    assert index.count("logical", topic="series") == 1
+
+    # Replacing goes through remove, which must find the slot in every bucket exactly once
+    index.add({"_id": "a", "category": "logical", "topic": "coding"})
+    assert index.count("logical") == 2
+    assert index.count("logical", topic="coding") == 1
+
+    assert index.remove("a") and index.remove("b")
+    assert len(index) == 0 and index.count("logical") == 0
+    assert index.generate_paper(PaperSpec(size=1)).shortfall == 1
+
+
+def test_topicless_question_is_not_drawn_twice_as_often():
+    index = QuestionIndex.from_questions([
+        {"_id": "plain", "category": "logical"},
+        {"_id": "tagged", "category": "logical", "topic": "series", "difficulty": "easy"},
+    ])
+    rng = random.Random(0)
+
+    counts = collections.Counter(qid for _ in range(4000)
+                                 for qid in index.generate_paper(PaperSpec(size=1), rng).question_ids)
+
+    assert all(1800 < count < 2200 for count in counts.values()), counts
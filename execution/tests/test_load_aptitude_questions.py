@@ -0,0 +1,177 @@
+"""
+Incremental loader against mongomock.
+
+Run from the repository root:
+  pip install pymongo mongomock
+  python -m pytest execution/tests
+"""
+
+import copy
+import os
+import sys
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo.errors import BulkWriteError  # noqa: E402
+
+from load_aptitude_questions import KEY_FIELD, load_questions, question_key  # noqa: E402
+
+
+def _question(text, **fields):
+    question = {
+        "questionText": text,
+        "options": ["1", "2", "3", "4"],
+        "correctAnswer": 0,
+        "explanation": "Because.",
+        "shortcutMethod": "Guess.",
+        "topic": "percentages",
+        "category": "quantitative",
+        "difficulty": "easy",
+        "companyTags": ["TCS"],
+    }
+    question.update(fields)
+    return question
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.aptitudequestions
+
+
+@pytest.fixture
+def bank():
+    return [_question(f"What is {i} + {i}?") for i in range(5)]
+
+
+def test_first_load_inserts_and_second_is_a_no_op(collection, bank):
+    stats = load_questions(collection, bank, batch_size=2)
+    assert (stats.inserted, stats.batches) == (5, 3)
+    assert collection.count_documents({KEY_FIELD: {"$exists": True}}) == 5
+    assert collection.find_one({})["timesAttempted"] == 0
+
+    stats = load_questions(collection, bank)
+    assert (stats.inserted, stats.updated, stats.unchanged, stats.batches) == (0, 0, 5, 0)
+
+
+def test_update_keeps_statistics_and_drops_removed_fields(collection, bank):
+    load_questions(collection, bank)
+    key = question_key(bank[0])
+    collection.update_one({KEY_FIELD: key}, {"$set": {"timesAttempted": 7}})
+
+    changed = copy.deepcopy(bank)
+    changed[0]["explanation"] = "Add them."
+    del changed[0]["shortcutMethod"]
+    stats = load_questions(collection, changed)
+
+    assert (stats.updated, stats.unchanged) == (1, 4)
+    stored = collection.find_one({KEY_FIELD: key})
+    assert stored["explanation"] == "Add them."
+    assert "shortcutMethod" not in stored
+    assert stored["timesAttempted"] == 7
+    assert load_questions(collection, changed).unchanged == 5
+
+
+def test_prune_removes_only_managed_questions(collection, bank):
+    load_questions(collection, bank)
+    collection.insert_one({"questionText": "Saved by the Node service", "category": "logical", "topic": "coding"})
+
+    stats = load_questions(collection, bank[1:])
+
+    assert stats.deleted == 1
+    assert collection.count_documents({KEY_FIELD: question_key(bank[0])}) == 0
+    assert collection.count_documents({"questionText": "Saved by the Node service"}) == 1
+
+
+def test_invalid_question_is_not_pruned(collection, bank):
+    load_questions(collection, bank)
+    broken = copy.deepcopy(bank)
+    broken[0]["correctAnswer"] = 9
+
+    stats = load_questions(collection, broken)
+
+    assert (stats.invalid, stats.deleted) == (1, 0)
+    assert collection.count_documents({KEY_FIELD: question_key(bank[0])}) == 1
+
+
+def test_no_prune_keeps_missing_questions(collection, bank):
+    load_questions(collection, bank)
+    stats = load_questions(collection, bank[:2], prune=False)
+    assert stats.deleted == 0
+    assert collection.count_documents({}) == 5
+
+
+def test_legacy_documents_are_adopted_not_duplicated(collection, bank):
+    legacy = {k: v for k, v in bank[0].items() if k != "shortcutMethod"}
+    legacy.update(timesAttempted=3, explanation="Old explanation.")
+    legacy_id = collection.insert_one(legacy).inserted_id
+
+    stats = load_questions(collection, bank)
+
+    assert (stats.adopted, stats.inserted) == (1, 4)
+    assert collection.count_documents({}) == 5
+    adopted = collection.find_one({"_id": legacy_id})
+    assert adopted[KEY_FIELD] == question_key(bank[0])
+    assert adopted["explanation"] == "Because."
+    assert adopted["timesAttempted"] == 3
+
+
+def test_dry_run_writes_nothing(collection, bank):
+    stats = load_questions(collection, bank, dry_run=True)
+    assert stats.inserted == 5
+    assert collection.count_documents({}) == 0
+
+
+def test_bulk_write_errors_do_not_stop_later_batches(collection, bank):
+    class FlakyCollection:
+        def __init__(self, inner):
+            self.inner = inner
+            self.calls = 0
+
+        def __getattr__(self, name):
+            return getattr(self.inner, name)
+
+        def bulk_write(self, ops, ordered=True):
+            self.calls += 1
+            if self.calls == 1:
+                # Unordered: the rest of the batch is still written
+                self.inner.bulk_write(ops[1:], ordered=ordered)
+                raise BulkWriteError({"writeErrors": [{"index": 0, "errmsg": "duplicate key"}]})
+            return self.inner.bulk_write(ops, ordered=ordered)
+
+    flaky = FlakyCollection(collection)
+    stats = load_questions(flaky, bank, batch_size=2)
+
+    assert (stats.write_errors, stats.batches, flaky.calls) == (1, 3, 3)
+    assert stats.inserted == collection.count_documents({}) == 4
+
+
+def test_failed_deletes_are_not_counted(collection, bank):
+    load_questions(collection, bank)
+
+    class RejectingCollection:
+        def __init__(self, inner):
+            self.inner = inner
+
+        def __getattr__(self, name):
+            return getattr(self.inner, name)
+
+        def bulk_write(self, ops, ordered=True):
+            raise BulkWriteError({"writeErrors": [{"index": i, "errmsg": "not primary"} for i in range(len(ops))]})
+
+    stats = load_questions(RejectingCollection(collection), bank[2:])
+
+    assert (stats.deleted, stats.write_errors) == (0, 2)
+    assert collection.count_documents({}) == 5
+
+
+def test_seed_does_not_prune_other_banks(collection, bank):
+    from seed_aptitude_questions import QUESTIONS, seed
+
+    load_questions(collection, bank)
+    seed(collection)
+
+    assert collection.count_documents({}) == len(bank) + len(QUESTIONS)